@@ -0,0 +1,78 @@
+"""Per-generation artifact bundles.
+
+Each generation gets a unique id and a directory
+``<build dir>/menus/<id>/`` holding its images (``<layout>.png``), its
+mailing text (``mail.txt``) and the menu it was generated from
+(``menu.json``). Files are written into a hidden staging directory that is
+renamed into place once complete, so readers never observe a partial
+bundle and concurrent generations never share a file.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+BUNDLES_DIRNAME = "menus"
+MAIL_FILENAME = "mail.txt"
+MENU_FILENAME = "menu.json"
+# The CLI republishes its bundle under this fixed id on every run.
+CLI_BUNDLE_ID = "menu"
+
+_BUNDLE_ID_PATTERN = re.compile(r"^\d{10,}-[0-9a-f]{12}$")
+# Ids generated before bundles existed: the epoch second, or the CLI default name.
+_LEGACY_ID_PATTERN = re.compile(r"^(\d+|menu)$")
+
+
+def new_bundle_id() -> str:
+    """Return a unique, chronologically sortable bundle id."""
+    return f"{int(time.time())}-{uuid.uuid4().hex[:12]}"
+
+
+def is_bundle_id(value: str) -> bool:
+    return bool(_BUNDLE_ID_PATTERN.match(value or ""))
+
+
+def is_legacy_id(value: str) -> bool:
+    return bool(_LEGACY_ID_PATTERN.match(value or ""))
+
+
+def bundle_dir(build_dir: Path, bundle_id: str) -> Path:
+    return Path(build_dir) / BUNDLES_DIRNAME / bundle_id
+
+
+class BundleWriter:
+    """Stage the files of a bundle, then publish them with one rename."""
+
+    def __init__(self, build_dir: Path, bundle_id: Optional[str] = None) -> None:
+        self.bundle_id = bundle_id or new_bundle_id()
+        self.target = bundle_dir(build_dir, self.bundle_id)
+        self.staging = self.target.parent / f".tmp-{self.bundle_id}-{uuid.uuid4().hex[:8]}"
+        self.staging.mkdir(parents=True, exist_ok=True)
+
+    def path(self, name: str) -> Path:
+        """Where to write ``name`` before publishing."""
+        return self.staging / name
+
+    def published_path(self, name: str) -> Path:
+        return self.target / name
+
+    def publish(self) -> Path:
+        """Move the staged files to the bundle directory."""
+        previous = None
+        if self.target.exists():
+            # Only reachable when an id is reused on purpose (CLI_BUNDLE_ID).
+            previous = self.target.with_name(f".old-{self.bundle_id}-{uuid.uuid4().hex[:8]}")
+            os.rename(self.target, previous)
+        os.rename(self.staging, self.target)
+        if previous is not None:
+            shutil.rmtree(previous, ignore_errors=True)
+        return self.target
+
+    def discard(self) -> None:
+        shutil.rmtree(self.staging, ignore_errors=True)
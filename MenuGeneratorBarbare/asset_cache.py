@@ -0,0 +1,112 @@
+"""Bounded in-memory cache of encoded render assets shared across requests."""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, Union
+
+from metrics import ASSET_CACHE_REQUESTS
+from paths import env_int
+
+DEFAULT_MAX_BYTES = env_int("MENU_ASSET_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+AssetValue = Union[str, bytes]
+
+# (mtime_ns, size, value), stored per (kind, resolved path)
+_Entry = Tuple[int, int, AssetValue]
+
+
+class AssetCache:
+    """LRU cache of file-derived values validated against the file mtime and size.
+
+    Values are either encoded strings (data URIs) or raw bytes, and count
+    towards ``max_bytes`` by their length.
+
+    A rewritten file (new sandwich image, new logo) changes its stat
+    signature, so stale entries are never served even when another worker
+    performed the write; :meth:`invalidate` drops them eagerly in-process.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, kind: str, path: Path, loader: Callable[[Path], AssetValue]) -> AssetValue:
+        """Return ``loader(path)``, reusing the cached value while the file is unchanged."""
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except OSError:
+            raise FileNotFoundError(path)
+
+        key = (kind, str(path.resolve()))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                ASSET_CACHE_REQUESTS.labels(result="hit").inc()
+                return entry[2]
+            self.misses += 1
+        ASSET_CACHE_REQUESTS.labels(result="miss").inc()
+
+        value = loader(path)
+
+        with self._lock:
+            self._discard(key)
+            if len(value) <= self.max_bytes:
+                self._entries[key] = (stat.st_mtime_ns, stat.st_size, value)
+                self._size += len(value)
+                while self._size > self.max_bytes:
+                    oldest = next(iter(self._entries))
+                    self._discard(oldest)
+                    self.evictions += 1
+        return value
+
+    def _discard(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[2])
+
+    def invalidate(self, path: Path) -> None:
+        """Drop every cached value derived from ``path``."""
+        resolved = str(Path(path).resolve())
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == resolved]:
+                self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+
+_cache: Optional[AssetCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_asset_cache() -> AssetCache:
+    """Return the process-wide asset cache."""
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = AssetCache()
+        return _cache
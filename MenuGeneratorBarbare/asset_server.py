@@ -0,0 +1,127 @@
+"""Local HTTP origin serving render assets to Chromium from memory.
+
+Inlining the font, logo and sandwich images as base64 data URIs makes the
+page markup several megabytes long and prevents Chromium from reusing
+decoded resources between renders. Instead, the renderer can reference
+short ``http://127.0.0.1:<port>/assets/<token>/<name>`` URLs answered by
+this server from the shared :class:`AssetCache`. Tokens are derived from
+the file path, mtime and size, so responses are cached as immutable and a
+rewritten file always gets a new URL.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mimetypes
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from asset_cache import AssetCache, get_asset_cache
+
+
+def _read_bytes(path: Path) -> bytes:
+    return Path(path).read_bytes()
+
+
+class AssetServer:
+    """Serve registered files on a loopback port until :meth:`shutdown`."""
+
+    def __init__(self, asset_cache: Optional[AssetCache] = None) -> None:
+        self._asset_cache = asset_cache if asset_cache is not None else get_asset_cache()
+        # Only the latest token of each path is served: a rewritten file
+        # replaces its old entry instead of piling up one per mtime.
+        self._registry: Dict[str, Path] = {}
+        self._tokens: Dict[Path, str] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="menu-asset-server",
+            daemon=True,
+        )
+        self._thread.start()
+
+    @property
+    def origin(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url_for(self, path: Path) -> str:
+        """Register ``path`` and return the URL Chromium should load it from."""
+        resolved = Path(path).resolve()
+        stat = resolved.stat()
+        token = hashlib.sha1(
+            f"{resolved}:{stat.st_mtime_ns}:{stat.st_size}".encode("utf8")
+        ).hexdigest()[:20]
+        with self._lock:
+            previous = self._tokens.get(resolved)
+            if previous != token:
+                self._registry.pop(previous, None)
+                self._tokens[resolved] = token
+                self._registry[token] = resolved
+        return f"{self.origin}/assets/{token}/{quote(resolved.name)}"
+
+    def _lookup(self, request_path: str) -> Optional[Path]:
+        parts = request_path.split("/")
+        if len(parts) < 3 or parts[1] != "assets":
+            return None
+        with self._lock:
+            return self._registry.get(parts[2])
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class AssetRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 - http.server API
+                path = server._lookup(self.path.split("?", 1)[0])
+                body = None
+                if path is not None:
+                    try:
+                        body = server._asset_cache.get("bytes", path, _read_bytes)
+                    except FileNotFoundError:
+                        body = None
+
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                mime_type, _ = mimetypes.guess_type(str(path))
+                self.send_response(200)
+                self.send_header("Content-Type", mime_type or "application/octet-stream")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_args: object) -> None:
+                pass
+
+        return AssetRequestHandler
+
+    def shutdown(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+_server_lock = threading.Lock()
+_server: Optional[AssetServer] = None
+_server_pid: Optional[int] = None
+
+
+def get_asset_server() -> AssetServer:
+    """Return the asset server of the current process, starting it on first use."""
+    global _server, _server_pid
+
+    with _server_lock:
+        if _server is None or _server_pid != os.getpid():
+            _server = AssetServer()
+            _server_pid = os.getpid()
+        return _server
@@ -0,0 +1,145 @@
+"""Generate the menus of several weeks in one run.
+
+A batch is a list of ``(week start, week data)`` pairs. Every week is
+published as its own bundle; the weeks share one warm browser and up to
+``concurrency`` of them are in flight at once, so the pages of one week
+are laid out while another is being screenshotted. A manifest listing the
+outputs of each week is written under ``<build dir>/batches/``.
+
+Usage::
+
+    python batch_generate.py weeks.json [--concurrency 4] [--manifest out.json]
+
+where ``weeks.json`` is a list of ``{"week_start": "YYYY-MM-DD", "menu": ...}``
+objects and ``menu`` follows the ``meal.json`` schema (or is the path of
+such a file, relative to ``weeks.json``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from artifact_bundles import MAIL_FILENAME, bundle_dir, new_bundle_id
+from file_utils import atomic_write_json
+from main import MenuGenerator, week_monday
+from paths import env_int, get_build_dir
+
+Week = Tuple[date, Dict[str, Any]]
+
+DEFAULT_CONCURRENCY = env_int("MENU_BATCH_CONCURRENCY", 4)
+
+
+def get_batch_dir() -> Path:
+    return get_build_dir() / "batches"
+
+
+def load_weeks(path: Path) -> List[Week]:
+    """Read a batch file; ``menu`` may be inline or the path of a ``meal.json``."""
+    path = Path(path)
+    with open(path, "r", encoding="utf8") as file:
+        entries = json.load(file)
+    if not isinstance(entries, list):
+        raise ValueError(f"{path} must contain a list of weeks")
+
+    weeks: List[Week] = []
+    for position, entry in enumerate(entries):
+        try:
+            week_start = date.fromisoformat(str(entry["week_start"]))
+            menu = entry["menu"]
+        except (KeyError, TypeError, ValueError) as exc:
+            raise ValueError(f"Week {position} of {path} needs a 'week_start' date and a 'menu'") from exc
+        if isinstance(menu, str):
+            with open(path.parent / menu, "r", encoding="utf8") as file:
+                menu = json.load(file)
+        if not isinstance(menu, dict):
+            raise ValueError(f"The menu of week {position} of {path} must be an object")
+        weeks.append((week_start, menu))
+    return weeks
+
+
+def generate_batch(
+    weeks: Sequence[Week],
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    generator: Optional[MenuGenerator] = None,
+    manifest_path: Optional[Path] = None,
+) -> Dict[str, Any]:
+    """Render every week and write the manifest; returns it.
+
+    A failing week is recorded in the manifest without stopping the others.
+    """
+    generator = generator or MenuGenerator()
+    batch_id = new_bundle_id()
+    manifest_path = Path(manifest_path) if manifest_path is not None else get_batch_dir() / f"{batch_id}.json"
+
+    def render(renderer, week: Week) -> Dict[str, Any]:
+        week_start, week_data = week
+        entry: Dict[str, Any] = {
+            "week_start": week_monday(week_start).isoformat(),
+            "week_text": generator.get_week_text(week_monday(week_start)),
+        }
+        bundle_id = new_bundle_id()
+        try:
+            images, _email = generator.generate_menu(
+                week_data, bundle_id, week_start=week_start, renderer=renderer
+            )
+        except Exception as exc:
+            entry.update({"status": "failed", "error": str(exc)})
+            return entry
+        entry.update(
+            {
+                "status": "done",
+                "bundle": bundle_id,
+                **{layout_name: str(path) for layout_name, path in images.items()},
+                "mail": str(bundle_dir(generator.output_dir, bundle_id) / MAIL_FILENAME),
+            }
+        )
+        return entry
+
+    started = time.perf_counter()
+    with generator.create_renderer() as renderer:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="menu-batch") as executor:
+            results = list(executor.map(lambda week: render(renderer, week), weeks))
+    elapsed = time.perf_counter() - started
+
+    done = sum(1 for entry in results if entry["status"] == "done")
+    manifest = {
+        "batch": batch_id,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "weeks": results,
+        "done": done,
+        "failed": len(results) - done,
+        "elapsed_seconds": round(elapsed, 3),
+        "weeks_per_second": round(done / elapsed, 3) if elapsed > 0 else 0.0,
+    }
+    atomic_write_json(manifest_path, manifest, indent=2)
+    manifest["manifest"] = str(manifest_path)
+    return manifest
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate the menus of several weeks.")
+    parser.add_argument("weeks", type=Path, help="JSON list of {week_start, menu} objects")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="weeks rendered at once")
+    parser.add_argument("--manifest", type=Path, default=None, help="where to write the manifest")
+    args = parser.parse_args(argv)
+
+    manifest = generate_batch(load_weeks(args.weeks), concurrency=args.concurrency, manifest_path=args.manifest)
+    for entry in manifest["weeks"]:
+        outcome = entry.get("bundle") if entry["status"] == "done" else f"failed: {entry['error']}"
+        print(f"{entry['week_start']}  {outcome}")
+    print(
+        f"{manifest['done']} week(s) in {manifest['elapsed_seconds']:.2f} s "
+        f"({manifest['weeks_per_second']:.2f} weeks/s), manifest: {manifest['manifest']}"
+    )
+    return 1 if manifest["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,159 @@
+"""Timing, JSON reports and run comparison for the benchmark suite."""
+
+from __future__ import annotations
+
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+REPORT_VERSION = 1
+DEFAULT_THRESHOLD = 0.10
+
+
+class ScenarioSkipped(Exception):
+    """A scenario cannot run here (no browser, no generated menu...)."""
+
+
+def measure(
+    action: Callable[[], Any],
+    runs: int,
+    *,
+    warmup: int = 1,
+    setup: Optional[Callable[[], Any]] = None,
+) -> List[float]:
+    """Wall time of ``runs`` calls of ``action``, in seconds, after ``warmup`` unmeasured ones.
+
+    ``setup`` runs before every call, outside the measured time.
+    """
+    timings: List[float] = []
+    for index in range(warmup + max(1, runs)):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - started
+        if index >= warmup:
+            timings.append(elapsed)
+    return timings
+
+
+def result(scenario: str, variant: str, timings: List[float], **params: Any) -> Dict[str, Any]:
+    """One line of a report; ``name`` identifies it across runs."""
+    name = "/".join([scenario, variant] + [f"{key}={value}" for key, value in params.items()])
+    return {
+        "name": name,
+        "scenario": scenario,
+        "variant": variant,
+        "params": params,
+        "runs": len(timings),
+        "median_s": statistics.median(timings),
+        "mean_s": statistics.mean(timings),
+        "min_s": min(timings),
+        "max_s": max(timings),
+        "stdev_s": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def _git_commit(root: Path) -> Optional[str]:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+def report(results: List[Dict[str, Any]], skipped: List[Dict[str, str]], **settings: Any) -> Dict[str, Any]:
+    return {
+        "version": REPORT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "commit": _git_commit(Path(__file__).resolve().parent),
+        },
+        "settings": settings,
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """Median time of every result in both reports, and whether it regressed.
+
+    A result regresses when its median grew by more than ``threshold``
+    (a fraction: 0.10 is 10 %), and improves when it shrank by as much.
+    """
+    base_results = {entry["name"]: entry for entry in base.get("results", [])}
+    rows: List[Dict[str, Any]] = []
+    for entry in head.get("results", []):
+        previous = base_results.pop(entry["name"], None)
+        if previous is None:
+            rows.append({"name": entry["name"], "base_s": None, "head_s": entry["median_s"], "change": None, "status": "new"})
+            continue
+
+        change = entry["median_s"] / previous["median_s"] - 1 if previous["median_s"] else 0.0
+        if change > threshold:
+            status = "regression"
+        elif change < -threshold:
+            status = "improvement"
+        else:
+            status = "unchanged"
+        rows.append({
+            "name": entry["name"],
+            "base_s": previous["median_s"],
+            "head_s": entry["median_s"],
+            "change": change,
+            "status": status,
+        })
+
+    for name, previous in base_results.items():
+        rows.append({"name": name, "base_s": previous["median_s"], "head_s": None, "change": None, "status": "missing"})
+    return rows
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.3f}s"
+
+
+def print_results(results: List[Dict[str, Any]], skipped: List[Dict[str, str]], stream=sys.stderr) -> None:
+    width = max([len(entry["name"]) for entry in results] + [4])
+    print(f"{'name':<{width}} {'runs':>5} {'median':>11} {'min':>11} {'max':>11}", file=stream)
+    for entry in results:
+        print(
+            f"{entry['name']:<{width}} {entry['runs']:>5} {format_duration(entry['median_s']):>11} "
+            f"{format_duration(entry['min_s']):>11} {format_duration(entry['max_s']):>11}",
+            file=stream,
+        )
+    for entry in skipped:
+        print(f"skipped {entry['scenario']}: {entry['reason']}", file=stream)
+
+
+def print_comparison(rows: List[Dict[str, Any]], stream=sys.stdout) -> None:
+    width = max([len(row["name"]) for row in rows] + [4])
+    print(f"{'name':<{width}} {'base':>11} {'head':>11} {'change':>8}  status", file=stream)
+    for row in rows:
+        change = f"{row['change'] * 100:+.1f}%" if row["change"] is not None else "-"
+        print(
+            f"{row['name']:<{width}} {format_duration(row['base_s']):>11} "
+            f"{format_duration(row['head_s']):>11} {change:>8}  {row['status']}",
+            file=stream,
+        )
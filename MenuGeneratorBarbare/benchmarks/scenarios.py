@@ -0,0 +1,409 @@
+"""The scenarios of the benchmark suite.
+
+Each scenario yields harness results and raises ``ScenarioSkipped`` when it
+cannot run in this environment. ``suite.py`` configures the environment
+(build directory, renderer) before this module is imported.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import itertools
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+
+from harness import ScenarioSkipped, measure, result
+
+from asset_cache import AssetCache
+from ingredient_index import IngredientIndex
+from main import FONT_PATH, PROJECT_ROOT, SANDWICH_DIR, CLIParser, MenuGenerator, quote
+from pillow_renderer import PillowRenderer
+from playwright_renderer import ASSET_MODES, DEFAULT_ASSET_MODE, DEFAULT_PAGE_MODE, PAGE_MODES, PlaywrightRenderer, _to_data_uri
+from renderer_pool import RendererPool
+
+Results = Iterator[Dict[str, Any]]
+
+
+def load_menu(path: Path) -> Dict[str, Any]:
+    with open(path, encoding="utf8") as file:
+        return json.load(file)
+
+
+def build_jobs(generator: MenuGenerator, week_data: Dict[str, Any], output_dir: Path) -> List[Dict[str, Any]]:
+    content, _warnings = generator._normalize_content(week_data.get("content", []))
+    week_text = generator.get_next_week_text()
+    return [
+        {
+            "layout_name": layout_name,
+            "week_text": generator._layout_week_text(layout_name, week_text),
+            "cells": generator._build_cells(layout_name, week_data.get("header", []), content),
+            "output_path": output_dir / f"bench-{layout_name}.png",
+        }
+        for layout_name in generator.layouts
+    ]
+
+
+def _playwright_renderer(generator: MenuGenerator, pool: RendererPool, **options: Any) -> PlaywrightRenderer:
+    return PlaywrightRenderer(
+        colors=generator.colors,
+        layouts=generator.layouts,
+        font_path=FONT_PATH,
+        logo_path=generator.logo_path,
+        sandwich_dir=SANDWICH_DIR,
+        pool=pool,
+        **options,
+    )
+
+
+def bench_playwright(options: Any) -> Results:
+    """Both layouts with a cold browser (launched for the render) and a warm one."""
+    generator = MenuGenerator()
+    with tempfile.TemporaryDirectory() as output_dir:
+        jobs = build_jobs(generator, load_menu(options.menu), Path(output_dir))
+
+        def cold_render() -> None:
+            pool = RendererPool(size=1, max_renders=0, max_memory_mb=0)
+            try:
+                with _playwright_renderer(generator, pool) as renderer:
+                    renderer.render_layouts(jobs)
+            finally:
+                pool.shutdown()
+
+        try:
+            cold = measure(cold_render, options.runs, warmup=0)
+        except Exception as exc:
+            reason = str(exc).strip().splitlines()[0] if str(exc).strip() else type(exc).__name__
+            raise ScenarioSkipped(f"Chromium cannot be launched: {reason}") from exc
+        yield result("playwright", "cold", cold, asset_mode=DEFAULT_ASSET_MODE, page_mode=DEFAULT_PAGE_MODE)
+
+        for asset_mode, page_mode in itertools.product(ASSET_MODES, PAGE_MODES):
+            pool = RendererPool(size=1, max_renders=0, max_memory_mb=0)
+            try:
+                with _playwright_renderer(generator, pool, asset_mode=asset_mode, page_mode=page_mode) as renderer:
+                    warm = measure(lambda: renderer.render_layouts(jobs), options.runs)
+            finally:
+                pool.shutdown()
+            yield result("playwright", "warm", warm, asset_mode=asset_mode, page_mode=page_mode)
+
+
+def bench_pillow(options: Any) -> Results:
+    """Both layouts drawn and encoded by the Pillow backend."""
+    generator = MenuGenerator()
+    with tempfile.TemporaryDirectory() as output_dir:
+        jobs = build_jobs(generator, load_menu(options.menu), Path(output_dir))
+        renderer = PillowRenderer(
+            colors=generator.colors,
+            layouts=generator.layouts,
+            font_path=FONT_PATH,
+            logo_path=generator.logo_path,
+            sandwich_dir=SANDWICH_DIR,
+        )
+        with renderer:
+            yield result("pillow", "render", measure(lambda: renderer.render_layouts(jobs), options.runs))
+
+
+def synthetic_cells(week_data: Dict[str, Any], count: int) -> List[Dict[str, Any]]:
+    """``count`` cells cycling through the days of a menu."""
+    days = week_data.get("content") or [{"content": []}]
+    return [
+        {"label": f"Jour {index + 1}", "items": days[index % len(days)].get("content", [])}
+        for index in range(count)
+    ]
+
+
+def bench_build_html(options: Any) -> Results:
+    """Page markup of the vertical layout for growing numbers of cells."""
+    generator = MenuGenerator()
+    content, _warnings = generator._normalize_content(load_menu(options.menu).get("content", []))
+    layout = generator.layouts["vertical"]
+    renderer = _playwright_renderer(generator, pool=None, asset_mode="inline")
+    week_text = generator.get_next_week_text()
+
+    for count in options.cells:
+        cells = synthetic_cells({"content": content}, count)
+        timings = measure(lambda: renderer._build_html("vertical", layout, week_text, cells), options.runs * 10)
+        yield result("build_html", "vertical", timings, cells=count)
+
+
+def bench_data_uri(options: Any) -> Results:
+    """Encoding every image of ``Sandwichlogo/`` as a data URI, directly and through the asset cache."""
+    paths = sorted(SANDWICH_DIR.glob("*.png"))
+    if not paths:
+        raise ScenarioSkipped(f"no image in {SANDWICH_DIR}")
+
+    yield result("data_uri", "encode", measure(lambda: [_to_data_uri(path) for path in paths], options.runs), files=len(paths))
+
+    cache = AssetCache(max_bytes=1024 * 1024 * 1024)
+    timings = measure(lambda: [cache.get("data-uri", path, _to_data_uri) for path in paths], options.runs)
+    yield result("data_uri", "cached", timings, files=len(paths))
+
+
+def scaled_ingredients(ingredients: List[List[str]], scale: int) -> List[List[str]]:
+    """``scale`` copies of the ingredients, every copy but the first renamed."""
+    return [
+        [entry[0] if copy == 0 else f"{entry[0]} {copy}", *entry[1:]]
+        for copy in range(scale)
+        for entry in ingredients
+    ]
+
+
+def bench_find_ingredient(options: Any) -> Results:
+    """Index build and the lookup of every meal, plus misses, over ``ingredients.json`` scaled up."""
+    ingredients = load_menu(PROJECT_ROOT / "ingredients.json")
+    meals = load_menu(PROJECT_ROOT / "mealList.json")
+    queries = [meal["name"] for meal in meals] + [f"Introuvable {index}" for index in range(10)]
+    generator = MenuGenerator()
+
+    for scale in options.scales:
+        entries = scaled_ingredients(ingredients, scale)
+        yield result("find_ingredient", "build", measure(lambda: IngredientIndex(entries), options.runs), scale=scale)
+
+        index: Dict[str, IngredientIndex] = {}
+
+        def lookup_all() -> None:
+            # Misses are reported on stdout, which would swamp the timings.
+            with contextlib.redirect_stdout(io.StringIO()):
+                for query in queries:
+                    generator.find_ingredient(index["current"], query)
+
+        timings = measure(lookup_all, options.runs, setup=lambda: index.update(current=IngredientIndex(entries)))
+        yield result("find_ingredient", "lookup", timings, scale=scale, queries=len(queries))
+
+
+class LegacyCLIParser:
+    """The parser as it was before the tokenizer, kept for comparison."""
+
+    def parse_string_argument(self, args, index):
+        string = ""
+        while index < len(args) and not args[index].endswith("\""):
+            string += args[index] + " "
+            index += 1
+
+        if index < len(args):
+            string += args[index]
+
+        return string[1:-1], index
+
+    def parse_arguments(self, args):
+        week_data = {
+            "header": [],
+            "text-custom-french": "",
+            "text-custom-english": "",
+            "content": []
+        }
+
+        i = 0
+        while i < len(args):
+            if args[i] == "--header":
+                header = []
+                i += 1
+                while i < len(args) and not args[i].startswith("--"):
+                    header.append(args[i])
+                    i += 1
+                week_data["header"] = header
+
+            elif args[i] == "--custom-text-french":
+                text, i = self.parse_string_argument(args, i+1)
+                i += 1
+                week_data["text-custom-french"] = text
+
+            elif args[i] == "--custom-text-english":
+                text, i = self.parse_string_argument(args, i+1)
+                i += 1
+                week_data["text-custom-english"] = text
+
+            elif args[i] == "--content":
+                day = {
+                    "day": args[i+2],
+                    "content": []
+                }
+                i += 3
+
+                if args[i] == "--day-content":
+                    i += 1
+                else:
+                    i += 1
+                    continue
+
+                while i < len(args) and args[i] != "--content":
+                    content = {
+                        "text": "",
+                        "is_meal": False
+                    }
+
+                    if args[i] == "--is-meal":
+                        content["is_meal"] = True
+                        i += 1
+
+                    if args[i] == "--text":
+                        text, i = self.parse_string_argument(args, i+1)
+                        content["text"] = text
+                        i += 1
+
+                    if i < len(args) and args[i] == "--img":
+                        content["img"] = args[i+1]
+                        i += 2
+
+                    day["content"].append(content)
+
+                week_data["content"].append(day)
+            else:
+                i += 1
+
+        return week_data
+
+
+def synthetic_menu(days: int, words: int) -> str:
+    """A CLI menu of ``days`` days of two items whose quoted texts are ``words`` words long."""
+    text = " ".join(f"mot{index}" for index in range(words))
+    parts = [
+        "--header " + " ".join(f"Jour{index}" for index in range(days)),
+        f"--custom-text-french {quote(text)}",
+        f"--custom-text-english {quote(text)}",
+    ]
+    for index in range(days):
+        parts.append(
+            f"--content --day Jour{index} --day-content "
+            f"--is-meal --text {quote(text)} --img Sandwich{index} --text {quote(text)}"
+        )
+    return " ".join(parts)
+
+
+def unterminated_menu(words: int) -> str:
+    """A CLI menu whose quoted text never closes and ends in a lone backslash.
+
+    The quote cannot be matched, and the tokenizer must give it up in time
+    linear in the length of the text.
+    """
+    text = " ".join(f"mot{index}" for index in range(words))
+    return f'--header Lundi --custom-text-french "{text}\\'
+
+
+# Texts sent by existing clients with unescaped quotes inside a word; both
+# parsers must read them the same way.
+EMBEDDED_QUOTE_MENUS = [
+    '--content --day Lundi --day-content --text "x"y" --img croque',
+    '--content --day Lundi --day-content --is-meal --text "Croque "maison"" --img croque --text "Plat"',
+    '--header Lun"di Mardi --custom-text-french "Le "chef" vous salue" --custom-text-english "Hi"',
+]
+
+
+def bench_cli_parser(options: Any) -> Results:
+    """The single-pass CLI parser and the split-and-rejoin one it replaced, on large menus."""
+    for menu in EMBEDDED_QUOTE_MENUS:
+        if LegacyCLIParser().parse_arguments(menu.split(" ")) != CLIParser().parse_arguments(menu):
+            raise ScenarioSkipped(f"parsers disagree on the embedded quotes of {menu!r}")
+
+    for days in options.days:
+        menu = synthetic_menu(days, options.words)
+        if LegacyCLIParser().parse_arguments(menu.split(" ")) != CLIParser().parse_arguments(menu):
+            raise ScenarioSkipped(f"parsers disagree on the {days}-day menu")
+
+        current = measure(lambda: CLIParser().parse_arguments(menu), options.runs)
+        yield result("cli_parser", "current", current, days=days, words=options.words)
+        legacy = measure(lambda: LegacyCLIParser().parse_arguments(menu.split(" ")), options.runs)
+        yield result("cli_parser", "legacy", legacy, days=days, words=options.words)
+
+    menu = unterminated_menu(options.words * 10)
+    unterminated = measure(lambda: CLIParser().parse_arguments(menu), options.runs)
+    yield result("cli_parser", "unterminated", unterminated, words=options.words * 10)
+
+
+def _load_server():
+    import server
+
+    return server
+
+
+def bench_generate(options: Any) -> Results:
+    """``POST /generateImages`` end to end with the configured renderer, rendered and from the render cache."""
+    server = _load_server()
+    client = server.app.test_client()
+    week_data = load_menu(options.menu)
+    counter = itertools.count()
+
+    def generate(menu: Dict[str, Any]) -> None:
+        response = client.post("/generateImages", json=menu)
+        if response.status_code != 200:
+            raise ScenarioSkipped(f"generation failed ({response.status_code}): {response.get_data(as_text=True)}")
+
+    def fresh_menu() -> Dict[str, Any]:
+        # A new header changes the cells, so the render cache misses.
+        return {**week_data, "header": [f"{day} {next(counter)}" for day in week_data.get("header", [])]}
+
+    yield result("generate", "render", measure(lambda: generate(fresh_menu()), options.runs))
+    yield result("generate", "cached", measure(lambda: generate(week_data), options.runs))
+
+
+def _drive(client_factory: Callable[[], Any], url: str, headers: Dict[str, str], requests: int, concurrency: int):
+    """Latencies of ``requests`` GETs spread over ``concurrency`` threads, the wall time and the failures."""
+    latencies: List[float] = []
+    failures = [0]
+    lock = threading.Lock()
+
+    def worker(count: int) -> None:
+        client = client_factory()
+        local: List[float] = []
+        failed = 0
+        for _ in range(count):
+            started = time.perf_counter()
+            response = client.get(url, headers=headers)
+            response.get_data()
+            local.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            failures[0] += failed
+
+    share, remainder = divmod(requests, concurrency)
+    threads = [
+        threading.Thread(target=worker, args=(share + (1 if index < remainder else 0),))
+        for index in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - started, failures[0]
+
+
+def bench_endpoints(options: Any) -> Results:
+    """Read endpoints through the Flask test client under growing concurrency."""
+    server = _load_server()
+    week_data = load_menu(options.menu)
+    images, _email = MenuGenerator().generate_menu(week_data)
+    bundle_id = next(iter(images.values())).parent.name
+
+    targets = [
+        ("meal_list", "/getMealList", {}),
+        ("style_config", "/styleConfig", {}),
+        ("mailing_text", f"/getMailingText?epoch={bundle_id}", {}),
+        ("menu_image", f"/verticalMenu?epoch={bundle_id}", {}),
+        ("menu_thumbnail", f"/verticalMenu?epoch={bundle_id}&width=720", {"Accept": "image/webp,image/*"}),
+    ]
+    for name, url, headers in targets:
+        for concurrency in options.concurrency:
+            latencies, wall, failures = _drive(server.app.test_client, url, headers, options.requests, concurrency)
+            entry = result("endpoints", name, latencies, concurrency=concurrency)
+            entry["requests_per_second"] = len(latencies) / wall if wall else 0.0
+            entry["failures"] = failures
+            yield entry
+
+
+SCENARIOS: Dict[str, Callable[[Any], Results]] = {
+    "playwright": bench_playwright,
+    "pillow": bench_pillow,
+    "build_html": bench_build_html,
+    "data_uri": bench_data_uri,
+    "find_ingredient": bench_find_ingredient,
+    "cli_parser": bench_cli_parser,
+    "generate": bench_generate,
+    "endpoints": bench_endpoints,
+}
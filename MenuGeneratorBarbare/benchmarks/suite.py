@@ -0,0 +1,131 @@
+"""Benchmark suite of the menu generator, with JSON reports and regression checks.
+
+Usage::
+
+    python benchmarks/suite.py run --output base.json
+    python benchmarks/suite.py run --only cli_parser find_ingredient --runs 10
+    python benchmarks/suite.py compare base.json head.json --threshold 0.1
+
+``run`` times every scenario (see ``scenarios.py``), prints a summary on
+stderr and writes the report as JSON (stdout by default). Scenarios that
+cannot run here, such as Playwright without Chromium, are listed as
+skipped. Nothing needs the network; renders go to a temporary build
+directory unless ``MENU_BUILD_DIR`` is set.
+
+``compare`` matches the results of two reports by name and flags those
+whose median grew by more than the threshold; it exits with status 1 when
+one did.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Configured before the generator modules read them on import.
+os.environ.setdefault("MENU_BUILD_DIR", tempfile.mkdtemp(prefix="menu-bench-"))
+os.environ.setdefault("MENU_RENDERER_PREWARM", "0")
+os.environ.setdefault("MENU_RETENTION_SWEEP_INTERVAL", "0")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from harness import DEFAULT_THRESHOLD, ScenarioSkipped, compare, print_comparison, print_results, report  # noqa: E402
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def run(args: argparse.Namespace) -> int:
+    if args.backend:
+        os.environ["MENU_RENDERER_BACKEND"] = args.backend
+    from scenarios import SCENARIOS
+
+    unknown = [name for name in args.only if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios {unknown}, expected some of {list(SCENARIOS)}")
+
+    results: List[Dict[str, Any]] = []
+    skipped: List[Dict[str, str]] = []
+    for name, scenario in SCENARIOS.items():
+        if args.only and name not in args.only:
+            continue
+        print(f"running {name}...", file=sys.stderr)
+        try:
+            # The generator prints its warnings; stdout is kept for the report.
+            with contextlib.redirect_stdout(sys.stderr):
+                for entry in scenario(args):
+                    results.append(entry)
+        except ScenarioSkipped as exc:
+            skipped.append({"scenario": name, "reason": str(exc)})
+
+    print_results(results, skipped)
+    data = report(
+        results,
+        skipped,
+        runs=args.runs,
+        backend=os.getenv("MENU_RENDERER_BACKEND", "playwright"),
+        menu=str(args.menu),
+    )
+    encoded = json.dumps(data, indent=2, ensure_ascii=False)
+    if args.output == "-":
+        print(encoded)
+    else:
+        Path(args.output).write_text(encoded + "\n", encoding="utf8")
+    return 0
+
+
+def compare_reports(args: argparse.Namespace) -> int:
+    with open(args.base, encoding="utf8") as file:
+        base = json.load(file)
+    with open(args.head, encoding="utf8") as file:
+        head = json.load(file)
+
+    rows = compare(base, head, args.threshold)
+    print_comparison(rows)
+    regressions = [row for row in rows if row["status"] == "regression"]
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the scenarios and write a JSON report")
+    run_parser.add_argument("--only", nargs="+", default=[], metavar="SCENARIO", help="scenarios to run (all by default)")
+    run_parser.add_argument("--output", default="-", help="report path, '-' for stdout")
+    run_parser.add_argument("--runs", type=int, default=5, help="measured runs per result")
+    run_parser.add_argument("--menu", type=Path, default=PROJECT_ROOT / "meal.json")
+    run_parser.add_argument("--backend", choices=("playwright", "pillow"), help="renderer of the end-to-end scenarios")
+    run_parser.add_argument("--cells", type=int, nargs="+", default=[1, 5, 10, 25, 50], help="cell counts of build_html")
+    run_parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="ingredients.json scales")
+    run_parser.add_argument("--days", type=int, nargs="+", default=[50, 200, 800], help="days of the CLI menus")
+    run_parser.add_argument("--words", type=int, default=200, help="words per quoted CLI text")
+    run_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="client threads of endpoints")
+    run_parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and concurrency")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="flag the regressions of a report against a baseline")
+    compare_parser.add_argument("base", type=Path)
+    compare_parser.add_argument("head", type=Path)
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="relative growth of the median counted as a regression (default 0.1)",
+    )
+    compare_parser.set_defaults(handler=compare_reports)
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
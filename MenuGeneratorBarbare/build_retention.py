@@ -0,0 +1,208 @@
+"""Index and retention policies for generated menu artifacts.
+
+Every generation writes an artifact into the build directory: a bundle
+directory (see ``artifact_bundles``) or, for older generations,
+``{id}-{layout}.png`` files. They are recorded in ``artifacts.json`` so listing and cleanup
+never have to scan the directory, and a sweeper deletes the artifacts that
+fall outside the configured retention policy. The index is only modified
+under an ``flock``, which makes the sweeper safe to run from every
+Gunicorn worker.
+"""
+
+from __future__ import annotations
+
+import re
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from file_utils import atomic_write_json, file_lock, read_json
+from paths import env_int, get_build_dir
+
+INDEX_FILENAME = "artifacts.json"
+LOCK_FILENAME = ".artifacts.lock"
+SWEEP_LOCK_FILENAME = ".retention.lock"
+
+_LEGACY_ARTIFACT_PATTERN = re.compile(r"^(?P<id>\d+)-(?P<layout>[A-Za-z0-9_]+)\.png$")
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """Limits applied by the sweeper; 0 disables a limit.
+
+    The most recent artifact is always kept so the front end can display it.
+    """
+
+    keep_last: int = 50
+    max_bytes: int = 512 * 1024 * 1024
+    max_age_seconds: int = 30 * 24 * 3600
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        return cls(
+            keep_last=env_int("MENU_RETENTION_KEEP_LAST", cls.keep_last),
+            max_bytes=env_int("MENU_RETENTION_MAX_BYTES", cls.max_bytes),
+            max_age_seconds=env_int("MENU_RETENTION_MAX_AGE_DAYS", cls.max_age_seconds // 86400) * 86400,
+        )
+
+    def expired(self, artifacts: List[Dict[str, Any]], now: float) -> List[Dict[str, Any]]:
+        """Return the artifacts to delete, given entries sorted oldest first."""
+        kept = list(artifacts)
+        removed: List[Dict[str, Any]] = []
+
+        def drop_oldest() -> None:
+            removed.append(kept.pop(0))
+
+        if self.max_age_seconds:
+            while len(kept) > 1 and now - kept[0]["created_at"] > self.max_age_seconds:
+                drop_oldest()
+        if self.keep_last:
+            while len(kept) > max(1, self.keep_last):
+                drop_oldest()
+        if self.max_bytes:
+            while len(kept) > 1 and sum(entry["bytes"] for entry in kept) > self.max_bytes:
+                drop_oldest()
+        return removed
+
+
+class ArtifactIndex:
+    """The ``artifacts.json`` file of a build directory."""
+
+    def __init__(self, build_dir: Optional[Path] = None) -> None:
+        self.build_dir = Path(build_dir) if build_dir is not None else get_build_dir()
+        self.index_path = self.build_dir / INDEX_FILENAME
+        self.lock_path = self.build_dir / LOCK_FILENAME
+
+    def _read(self) -> List[Dict[str, Any]]:
+        data = read_json(self.index_path)
+        if data is None:
+            return self._adopt_legacy_files()
+        return list(data.get("artifacts", [])) if isinstance(data, dict) else []
+
+    def _write(self, artifacts: List[Dict[str, Any]]) -> None:
+        artifacts.sort(key=lambda entry: entry["created_at"])
+        atomic_write_json(self.index_path, {"artifacts": artifacts})
+
+    def _adopt_legacy_files(self) -> List[Dict[str, Any]]:
+        """Group files generated before the index existed; scans the directory once."""
+        grouped: Dict[str, Dict[str, Any]] = {}
+        if not self.build_dir.is_dir():
+            return []
+        for path in self.build_dir.iterdir():
+            match = _LEGACY_ARTIFACT_PATTERN.match(path.name)
+            if not match or not path.is_file():
+                continue
+            stat = path.stat()
+            entry = grouped.setdefault(
+                match.group("id"),
+                {"id": match.group("id"), "files": [], "bytes": 0, "created_at": stat.st_mtime},
+            )
+            entry["files"].append(path.name)
+            entry["bytes"] += stat.st_size
+            entry["created_at"] = min(entry["created_at"], stat.st_mtime)
+        return sorted(grouped.values(), key=lambda entry: entry["created_at"])
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Live artifacts, oldest first."""
+        return self._read()
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        artifacts = self._read()
+        return artifacts[-1] if artifacts else None
+
+    def register(
+        self,
+        artifact_id: str,
+        paths: Iterable[Path],
+        *,
+        directory: Optional[Path] = None,
+    ) -> Dict[str, Any]:
+        """Record (or replace) an artifact made of files inside the build directory.
+
+        When the files live in a dedicated ``directory`` (an artifact bundle),
+        the whole directory is removed on expiry.
+        """
+        files = []
+        total = 0
+        for path in paths:
+            path = Path(path)
+            try:
+                total += path.stat().st_size
+            except OSError:
+                continue
+            files.append(path.relative_to(self.build_dir).as_posix())
+
+        entry = {"id": artifact_id, "files": files, "bytes": total, "created_at": time.time()}
+        if directory is not None:
+            entry["dir"] = Path(directory).relative_to(self.build_dir).as_posix()
+        with file_lock(self.lock_path):
+            artifacts = [item for item in self._read() if item["id"] != artifact_id]
+            artifacts.append(entry)
+            self._write(artifacts)
+        return entry
+
+    def sweep(self, policy: RetentionPolicy, *, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Delete artifacts outside ``policy``; returns the removed entries.
+
+        Returns immediately when another process is already sweeping.
+        """
+        now = time.time() if now is None else now
+        with file_lock(self.build_dir / SWEEP_LOCK_FILENAME, blocking=False) as acquired:
+            if not acquired:
+                return []
+
+            with file_lock(self.lock_path):
+                artifacts = self._read()
+                removed = policy.expired(artifacts, now)
+                if removed or not self.index_path.exists():
+                    removed_ids = {entry["id"] for entry in removed}
+                    self._write([entry for entry in artifacts if entry["id"] not in removed_ids])
+
+            for entry in removed:
+                if entry.get("dir"):
+                    shutil.rmtree(self.build_dir / entry["dir"], ignore_errors=True)
+                    continue
+                for name in entry["files"]:
+                    try:
+                        (self.build_dir / name).unlink()
+                    except OSError:
+                        continue
+            return removed
+
+
+class RetentionSweeper:
+    """Daemon thread applying the retention policy at a fixed interval."""
+
+    def __init__(
+        self,
+        index: ArtifactIndex,
+        policy: RetentionPolicy,
+        *,
+        interval: float = 600,
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ) -> None:
+        self.index = index
+        self.policy = policy
+        self.interval = max(1.0, float(interval))
+        self._on_error = on_error
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="retention-sweeper", daemon=True)
+
+    def start(self) -> "RetentionSweeper":
+        self._thread.start()
+        return self
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.index.sweep(self.policy)
+            except Exception as exc:
+                if self._on_error is not None:
+                    self._on_error(exc)
+            self._stop.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,455 @@
+"""Meal catalog shared by every Gunicorn worker.
+
+``mealList.json`` and ``ingredients.json`` stay the source of truth. Each
+worker keeps the parsed files in memory and revalidates them with a
+``stat`` (at most once per ``MENU_CATALOG_REVALIDATE_INTERVAL`` seconds),
+so a sandwich added on one worker shows up on the others without anyone
+re-parsing JSON on every request.
+
+New entries are not written into the JSON files directly: each one is
+appended as a ``{"seq": position, "entry": ...}`` line to a journal next
+to the file (``mealList.journal.jsonl``), which the other workers read
+from where they stopped. Once ``MENU_CATALOG_COMPACT_RECORDS`` records
+have accumulated, the journal is folded back into the JSON file. Records
+whose position is already in the JSON file are ignored, so a compaction
+interrupted between its two renames never duplicates an entry.
+
+Writes take an ``flock`` and re-check the duplicate rules, so concurrent
+adds can neither both pass the check nor overwrite each other. Duplicates
+are found through hash indexes on the accent-free, case-folded name and
+image code.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from file_utils import atomic_write_bytes, atomic_write_json, file_lock
+from ingredient_index import IngredientIndex, normalize_name
+from paths import env_float, env_int
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+MEAL_LIST_FILE = PROJECT_ROOT / "mealList.json"
+INGREDIENTS_FILE = PROJECT_ROOT / "ingredients.json"
+LOCK_FILENAME = ".catalog.lock"
+
+MEALS = "meals"
+INGREDIENTS = "ingredients"
+MEAL_KEY_FIELDS = ("name", "image")
+
+Signature = Tuple[int, int, int]
+Listener = Callable[[str], None]
+
+
+def normalize_key(value: Any) -> str:
+    """Key under which names and image codes must be unique."""
+    return normalize_name(str(value or "").strip())
+
+
+def normalize_image_code(raw_code: Optional[str]) -> str:
+    """Normalize supplied image codes and block path traversal attempts."""
+    if not raw_code:
+        return ""
+
+    cleaned = Path(raw_code).stem.strip()
+    cleaned = cleaned.replace('/', '').replace('\\', '')
+
+    if cleaned in {"", ".", ".."}:
+        return ""
+
+    return cleaned
+
+
+def sandwich_entries(
+    name: str,
+    image_code: str,
+    french_description: str,
+    english_description: str,
+    is_vegetarian: bool,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """The ``mealList.json`` and ``ingredients.json`` entries of a new sandwich."""
+    ingredient_name = name
+    if is_vegetarian and "(végé/veggie)" not in ingredient_name.lower():
+        ingredient_name = f"{ingredient_name} (végé/veggie)"
+    meal = {"name": name, "image": image_code}
+    ingredient = [ingredient_name, french_description, english_description or french_description]
+    return meal, ingredient
+
+
+def journal_path(path: Path) -> Path:
+    path = Path(path)
+    return path.with_name(f"{path.stem}.journal.jsonl")
+
+
+class CatalogError(RuntimeError):
+    """A catalog file could not be read or written; ``kind`` names which one."""
+
+    def __init__(self, kind: str, message: str) -> None:
+        super().__init__(message)
+        self.kind = kind
+
+
+class CatalogConflictError(ValueError):
+    """The new sandwich reuses an existing ``field`` ("name" or "image")."""
+
+    def __init__(self, field: str) -> None:
+        super().__init__(f"A sandwich with this {field} already exists")
+        self.field = field
+
+
+def _stat(path: Path) -> Optional[Signature]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    # Atomic replaces change the inode even when mtime and size collide.
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class _CatalogFile:
+    """A JSON list on disk, its journal, and their parsed content."""
+
+    def __init__(self, kind: str, path: Path, key_fields: Tuple[str, ...] = ()) -> None:
+        self.kind = kind
+        self.path = Path(path)
+        self.journal_path = journal_path(self.path)
+        self.key_fields = key_fields
+        self.data: Optional[List[Any]] = None
+        self.keys: Dict[str, Dict[str, int]] = {}
+        self.signature: Optional[Signature] = None
+        self.journal_inode: Optional[int] = None
+        self.journal_offset = 0
+        self.journal_records = 0
+        self.checked_at = 0.0
+
+    def _parse(self, strict: bool) -> List[Any]:
+        try:
+            with open(self.path, "r", encoding="utf8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return []
+        except json.JSONDecodeError as exc:
+            if strict:
+                # Never write on top of a file we could not read.
+                raise CatalogError(self.kind, f"{self.path} contains invalid JSON") from exc
+            print(f"Warning: {self.path} contains invalid JSON, using empty list")
+            return []
+        if not isinstance(data, list):
+            if strict:
+                raise CatalogError(self.kind, f"{self.path} does not contain a list")
+            print(f"Warning: {self.path} does not contain a list, using empty list")
+            return []
+        return data
+
+    def _add(self, entry: Any) -> None:
+        position = len(self.data)
+        self.data.append(entry)
+        if isinstance(entry, dict):
+            for field in self.key_fields:
+                key = normalize_key(entry.get(field))
+                if key:
+                    self.keys[field].setdefault(key, position)
+
+    def _read_journal(self) -> None:
+        """Apply the complete journal lines written since the last read."""
+        try:
+            with open(self.journal_path, "rb") as file:
+                self.journal_inode = os.fstat(file.fileno()).st_ino
+                file.seek(self.journal_offset)
+                chunk = file.read()
+        except FileNotFoundError:
+            self.journal_inode = None
+            return
+
+        # A line without its newline is still being written.
+        complete = chunk[:chunk.rfind(b"\n") + 1]
+        self.journal_offset += len(complete)
+        for line in complete.splitlines():
+            if not line.strip():
+                continue
+            self.journal_records += 1
+            try:
+                record = json.loads(line)
+                seq = int(record["seq"])
+                entry = record["entry"]
+            except (ValueError, KeyError, TypeError):
+                print(f"Warning: skipping an invalid record in {self.journal_path}")
+                continue
+            if seq >= len(self.data):
+                self._add(entry)
+
+    def _load(self, strict: bool) -> None:
+        entries = self._parse(strict)
+        self.data = []
+        self.keys = {field: {} for field in self.key_fields}
+        for entry in entries:
+            self._add(entry)
+        self.journal_offset = 0
+        self.journal_records = 0
+        self._read_journal()
+
+    def _journal_replaced(self) -> bool:
+        try:
+            stat = self.journal_path.stat()
+        except FileNotFoundError:
+            return self.journal_inode is not None
+        return stat.st_ino != self.journal_inode or stat.st_size < self.journal_offset
+
+    def refresh(self, *, strict: bool = False) -> bool:
+        """Catch up with the files on disk; returns True when the content changed."""
+        self.checked_at = time.monotonic()
+        signature = _stat(self.path)
+        if self.data is None or signature != self.signature or self._journal_replaced():
+            self._load(strict)
+            self.signature = signature
+            return True
+        count = len(self.data)
+        self._read_journal()
+        return len(self.data) != count
+
+    def conflict(self, entry: Dict[str, Any]) -> Optional[str]:
+        """The first key field of ``entry`` already used by another entry."""
+        for field in self.key_fields:
+            key = normalize_key(entry.get(field))
+            if key and key in self.keys[field]:
+                return field
+        return None
+
+    def append(self, entries: List[Any]) -> int:
+        """Journal ``entries`` with one write; returns the offset to truncate to on rollback.
+
+        The caller holds the catalog lock and has just refreshed.
+        """
+        offset = self.journal_offset
+        records = [
+            json.dumps({"seq": len(self.data) + position, "entry": entry}, ensure_ascii=False) + "\n"
+            for position, entry in enumerate(entries)
+        ]
+        payload = "".join(records).encode("utf8")
+        descriptor = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(descriptor, payload)
+            os.fsync(descriptor)
+            self.journal_inode = os.fstat(descriptor).st_ino
+        finally:
+            os.close(descriptor)
+        self.journal_offset += len(payload)
+        self.journal_records += len(entries)
+        for entry in entries:
+            self._add(entry)
+        return offset
+
+    def rollback(self, offset: int) -> None:
+        """Drop the journal records written after ``offset``."""
+        os.truncate(self.journal_path, offset)
+        # Rebuilt from disk on next use, like every other worker will.
+        self.data = None
+
+    def compact(self) -> None:
+        """Fold the journal into the JSON file."""
+        if not self.journal_records:
+            return
+        atomic_write_json(self.path, self.data, indent=4)
+        self.signature = _stat(self.path)
+        atomic_write_bytes(self.journal_path, b"")
+        self.journal_inode = _stat(self.journal_path)[2]
+        self.journal_offset = 0
+        self.journal_records = 0
+
+
+class CatalogStore:
+    """Read, validate and write the meal list and the ingredient descriptions.
+
+    Returned lists are shared between requests and must be treated as
+    read-only.
+    """
+
+    def __init__(
+        self,
+        meal_file: Path = MEAL_LIST_FILE,
+        ingredients_file: Path = INGREDIENTS_FILE,
+        *,
+        lock_path: Optional[Path] = None,
+        revalidate_interval: Optional[float] = None,
+        compact_records: Optional[int] = None,
+    ) -> None:
+        self._files = {
+            MEALS: _CatalogFile(MEALS, meal_file, MEAL_KEY_FIELDS),
+            INGREDIENTS: _CatalogFile(INGREDIENTS, ingredients_file),
+        }
+        self.lock_path = Path(lock_path) if lock_path is not None else Path(meal_file).parent / LOCK_FILENAME
+        if revalidate_interval is None:
+            revalidate_interval = env_float("MENU_CATALOG_REVALIDATE_INTERVAL", 1.0)
+        self.revalidate_interval = max(0.0, revalidate_interval)
+        if compact_records is None:
+            compact_records = env_int("MENU_CATALOG_COMPACT_RECORDS", 200)
+        self.compact_records = max(1, compact_records)
+        self._lock = threading.RLock()
+        self._listeners: List[Listener] = []
+        self._index: Optional[IngredientIndex] = None
+        self._index_source: Optional[List[Any]] = None
+        self.generation = 0
+
+    def subscribe(self, listener: Listener) -> None:
+        """Call ``listener(kind)`` whenever this worker sees a catalog file change."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _notify(self, kinds: List[str]) -> None:
+        for kind in kinds:
+            for listener in list(self._listeners):
+                listener(kind)
+
+    def _revalidate(self, kind: str) -> List[str]:
+        """Refresh ``kind`` if its last check is too old; the caller holds ``_lock``."""
+        catalog_file = self._files[kind]
+        fresh = time.monotonic() - catalog_file.checked_at < self.revalidate_interval
+        if catalog_file.data is not None and fresh:
+            return []
+        if not catalog_file.refresh():
+            return []
+        self.generation += 1
+        return [kind]
+
+    def _get(self, kind: str) -> List[Any]:
+        with self._lock:
+            changed = self._revalidate(kind)
+            data = self._files[kind].data
+        self._notify(changed)
+        return data
+
+    def meals(self) -> List[Dict[str, Any]]:
+        return self._get(MEALS)
+
+    def ingredients(self) -> List[List[str]]:
+        return self._get(INGREDIENTS)
+
+    def find_conflict(self, meal: Dict[str, Any]) -> Optional[str]:
+        """Which of ``name``/``image`` of ``meal`` is already taken, if any.
+
+        A quick pre-check; ``add_sandwich`` repeats it under the lock.
+        """
+        with self._lock:
+            changed = self._revalidate(MEALS)
+            field = self._files[MEALS].conflict(meal)
+        self._notify(changed)
+        return field
+
+    def ingredient_index(self) -> IngredientIndex:
+        """Trigram index over the current ingredients, rebuilt only when they are reloaded."""
+        ingredients = self.ingredients()
+        with self._lock:
+            if self._index is None or self._index_source is not ingredients or len(self._index) > len(ingredients):
+                self._index = IngredientIndex(ingredients)
+                self._index_source = ingredients
+            else:
+                for ingredient in ingredients[len(self._index):]:
+                    self._index.append(ingredient)
+            return self._index
+
+    def add_sandwich(self, meal: Dict[str, Any], ingredient: List[str]) -> None:
+        """Append a meal and its ingredient descriptions to both files.
+
+        Raises ``CatalogConflictError`` when the name or image code is taken
+        and ``CatalogError`` when a file cannot be read or written; the meal
+        is withdrawn again if the ingredients cannot be saved.
+        """
+        field = self.add_sandwiches([(meal, ingredient)])[0]
+        if field is not None:
+            raise CatalogConflictError(field)
+
+    def add_sandwiches(self, items: List[Tuple[Dict[str, Any], List[str]]]) -> List[Optional[str]]:
+        """Append several sandwiches in one transaction.
+
+        Returns, for each item, the field it conflicts on (with the catalog or
+        an earlier item) or None when it was added. Either every
+        non-conflicting item is saved or, on ``CatalogError``, none is.
+        """
+        meals_file = self._files[MEALS]
+        ingredients_file = self._files[INGREDIENTS]
+        changed: List[str] = []
+        try:
+            with self._lock, file_lock(self.lock_path):
+                # Another worker may have written since our last revalidation.
+                changed = [kind for kind, catalog_file in self._files.items() if catalog_file.refresh(strict=True)]
+                self.generation += bool(changed)
+
+                conflicts: List[Optional[str]] = []
+                batch_keys: Dict[str, set] = {field: set() for field in MEAL_KEY_FIELDS}
+                meals: List[Dict[str, Any]] = []
+                ingredients: List[List[str]] = []
+                for meal, ingredient in items:
+                    field = meals_file.conflict(meal)
+                    if field is None:
+                        field = next(
+                            (name for name in MEAL_KEY_FIELDS if normalize_key(meal.get(name)) in batch_keys[name]),
+                            None,
+                        )
+                    conflicts.append(field)
+                    if field is None:
+                        for name in MEAL_KEY_FIELDS:
+                            batch_keys[name].add(normalize_key(meal.get(name)))
+                        meals.append(meal)
+                        ingredients.append(ingredient)
+                if not meals:
+                    return conflicts
+
+                try:
+                    offset = meals_file.append(meals)
+                except OSError as exc:
+                    raise CatalogError(MEALS, f"Unable to write {meals_file.journal_path}: {exc}") from exc
+
+                try:
+                    ingredients_file.append(ingredients)
+                except OSError as exc:
+                    try:
+                        meals_file.rollback(offset)
+                    except OSError as rollback_error:
+                        print(f"Warning: unable to restore {meals_file.journal_path}: {rollback_error}")
+                    raise CatalogError(INGREDIENTS, f"Unable to write {ingredients_file.journal_path}: {exc}") from exc
+
+                self.generation += 1
+                changed = [MEALS, INGREDIENTS]
+                self._compact_if_needed()
+                return conflicts
+        finally:
+            self._notify(changed)
+
+    def _compact_if_needed(self) -> None:
+        for catalog_file in self._files.values():
+            if catalog_file.journal_records >= self.compact_records:
+                try:
+                    catalog_file.compact()
+                except OSError as exc:
+                    # The journal still holds every entry; retried on the next add.
+                    print(f"Warning: unable to compact {catalog_file.path}: {exc}")
+
+    def compact(self) -> None:
+        """Fold both journals into their JSON files now."""
+        with self._lock, file_lock(self.lock_path):
+            for catalog_file in self._files.values():
+                catalog_file.refresh(strict=True)
+                catalog_file.compact()
+
+
+_store: Optional[CatalogStore] = None
+_store_lock = threading.Lock()
+
+
+def get_catalog_store() -> CatalogStore:
+    """The catalog of ``mealList.json`` and ``ingredients.json`` for this process."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CatalogStore()
+        return _store
+
+
+if __name__ == "__main__":
+    get_catalog_store().compact()
+    print(f"Compacted {MEAL_LIST_FILE.name} and {INGREDIENTS_FILE.name}")
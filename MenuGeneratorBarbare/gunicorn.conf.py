@@ -0,0 +1,39 @@
+"""Gunicorn settings; metrics are aggregated across workers in multiprocess mode."""
+
+import os
+import shutil
+import sys
+from pathlib import Path
+
+# The config is loaded before gunicorn changes directory; paths only needs
+# the standard library, so importing it here leaves prometheus_client alone.
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from paths import env_int  # noqa: E402
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+# Formula for workers: (2 x $num_cores) + 1; 4 suits small to medium workloads.
+workers = env_int("GUNICORN_WORKERS", 4)
+threads = env_int("GUNICORN_THREADS", 2)
+timeout = 60
+keepalive = 5
+accesslog = "-"
+errorlog = "-"
+
+# Must be set before prometheus_client is imported, here or in the workers
+# forked from this process.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/menu-metrics")
+
+
+def on_starting(server):
+    """Start from an empty metrics directory; samples of a previous run would add up."""
+    directory = Path(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+    shutil.rmtree(directory, ignore_errors=True)
+    directory.mkdir(parents=True, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a dead worker (the queue depth)."""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,158 @@
+"""Downscaled sandwich and logo images sized for the menu layouts.
+
+Pictures are uploaded at full resolution but displayed a few hundred
+pixels wide. Derivatives are written once per target width under
+``<build dir>/derived/<sandwiches|logos>/<width>/<name>.png`` and picked by
+the renderer instead of the original whenever one is wide enough.
+"""
+
+from __future__ import annotations
+
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from PIL import Image
+
+from menu_layout import meal_image_display_width
+from paths import get_build_dir
+from style_config import get_style_snapshot
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+SANDWICH_DIR = PROJECT_ROOT / "Sandwichlogo"
+DEFAULT_MEAL_IMAGE_WIDTH = 250
+LOGO_DISPLAY_WIDTH = 360
+# Screenshots are taken at device scale 1; add 2 here if that ever changes.
+DERIVATIVE_SCALES = (1,)
+
+
+def get_derivative_dir() -> Path:
+    return get_build_dir() / "derived" / "sandwiches"
+
+
+def get_logo_derivative_dir() -> Path:
+    return get_build_dir() / "derived" / "logos"
+
+
+def logo_widths(scales: Sequence[int] = DERIVATIVE_SCALES) -> List[int]:
+    return [LOGO_DISPLAY_WIDTH * scale for scale in scales]
+
+
+def derivative_widths(
+    layouts: Dict[str, Dict[str, Any]],
+    base_width: int = DEFAULT_MEAL_IMAGE_WIDTH,
+    scales: Sequence[int] = DERIVATIVE_SCALES,
+) -> List[int]:
+    """Every pixel width needed to display sandwich images in ``layouts``."""
+    widths = {
+        meal_image_display_width(layout, base_width) * scale
+        for layout in layouts.values()
+        for scale in scales
+    }
+    return sorted(widths)
+
+
+def derivative_path(source_path: Path, width: int, root: Optional[Path] = None) -> Path:
+    root = root if root is not None else get_derivative_dir()
+    return root / str(int(width)) / f"{Path(source_path).stem}.png"
+
+
+def generate_derivatives(
+    source_path: Path,
+    widths: Iterable[int],
+    root: Optional[Path] = None,
+    image: Optional[Image.Image] = None,
+) -> List[Path]:
+    """Write a resized copy of ``source_path`` for each width narrower than it.
+
+    ``image`` is the already decoded RGBA content of ``source_path``, if at hand.
+    """
+    source_path = Path(source_path)
+    written: List[Path] = []
+
+    if image is None:
+        with Image.open(source_path) as source:
+            image = source.convert("RGBA")
+
+    for width in sorted(set(int(value) for value in widths)):
+        if width <= 0 or width >= image.width:
+            continue
+        height = max(1, round(image.height * width / image.width))
+        target = derivative_path(source_path, width, root)
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        temporary = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            image.resize((width, height), Image.LANCZOS).save(temporary, format="PNG", optimize=True)
+            os.replace(temporary, target)
+        finally:
+            if temporary.exists():
+                temporary.unlink()
+        written.append(target)
+
+    return written
+
+
+def select_image(
+    source_path: Path,
+    display_width: int,
+    widths: Iterable[int],
+    *,
+    scale: float = 1,
+    root: Optional[Path] = None,
+) -> Path:
+    """Return the smallest fresh derivative covering ``display_width * scale``.
+
+    Falls back on the original file when no derivative is wide enough or
+    when the original was replaced after the derivatives were generated.
+    """
+    source_path = Path(source_path)
+    needed = display_width * scale
+    try:
+        source_mtime = source_path.stat().st_mtime_ns
+    except OSError:
+        return source_path
+
+    for width in sorted(set(widths)):
+        if width < needed:
+            continue
+        candidate = derivative_path(source_path, width, root)
+        try:
+            if candidate.stat().st_mtime_ns >= source_mtime:
+                return candidate
+        except OSError:
+            continue
+    return source_path
+
+
+def backfill(
+    sandwich_dir: Path = SANDWICH_DIR,
+    widths: Optional[Iterable[int]] = None,
+    root: Optional[Path] = None,
+) -> int:
+    """Generate derivatives for every sandwich image and the configured logo.
+
+    Returns the number of files written.
+    """
+    style_config = get_style_snapshot().config
+    if widths is None:
+        widths = derivative_widths(style_config["layouts"])
+    widths = list(widths)
+
+    count = 0
+    logo_path = PROJECT_ROOT / style_config["assets"]["logo"]
+    if logo_path.is_file():
+        count += len(generate_derivatives(logo_path, logo_widths(), get_logo_derivative_dir()))
+
+    for source_path in sorted(Path(sandwich_dir).glob("*.png")):
+        try:
+            count += len(generate_derivatives(source_path, widths, root))
+        except OSError as exc:
+            print(f"Warning: unable to derive '{source_path.name}': {exc}")
+    return count
+
+
+if __name__ == "__main__":
+    written = backfill()
+    print(f"{written} derivatives written to {get_derivative_dir()}")
@@ -0,0 +1,86 @@
+"""In-memory trigram index over ingredient names.
+
+``MenuGenerator.find_ingredient`` returns the first entry of
+``ingredients.json`` whose accent-free, lower-cased name contains the
+accent-free, lower-cased meal name. The index answers the same question
+without normalizing every entry on every lookup: names are normalized
+once, and each trigram maps to the ascending positions of the names
+containing it, so only the entries containing the rarest query trigram
+are checked. ``catalog_store`` keeps one index per worker up to date.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from unidecode import unidecode
+
+Ingredient = Sequence[str]
+
+
+def normalize_name(value: str) -> str:
+    return unidecode(value.lower())
+
+
+def _trigrams(value: str) -> List[str]:
+    return [value[index:index + 3] for index in range(len(value) - 2)]
+
+
+class IngredientIndex:
+    """Substring lookup over ingredient names, built once and appended to."""
+
+    def __init__(self, ingredients: Sequence[Ingredient] = ()) -> None:
+        self._entries: List[Ingredient] = []
+        self._names: List[str] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._results: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        for ingredient in ingredients:
+            self._add(ingredient)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _add(self, ingredient: Ingredient) -> None:
+        position = len(self._entries)
+        name = normalize_name(ingredient[0])
+        self._entries.append(ingredient)
+        self._names.append(name)
+        for trigram in set(_trigrams(name)):
+            self._postings.setdefault(trigram, []).append(position)
+
+    def append(self, ingredient: Ingredient) -> None:
+        """Index a new entry; it ranks after every existing one."""
+        with self._lock:
+            self._add(ingredient)
+            # Only queries without a match can be affected by a new last entry.
+            self._results = {query: position for query, position in self._results.items() if position >= 0}
+
+    def _position(self, query: str) -> int:
+        if len(query) < 3:
+            for position, name in enumerate(self._names):
+                if query in name:
+                    return position
+            return -1
+
+        # Every match contains every query trigram: scan the rarest posting list.
+        candidates = min(
+            (self._postings.get(trigram, []) for trigram in set(_trigrams(query))),
+            key=len,
+        )
+        for position in candidates:
+            if query in self._names[position]:
+                return position
+        return -1
+
+    def find(self, name: str) -> Optional[Ingredient]:
+        """Return the first entry whose name contains ``name``, ignoring case and accents."""
+        query = normalize_name(name)
+        with self._lock:
+            position = self._results.get(query)
+            if position is None:
+                position = self._position(query)
+                self._results[query] = position
+            return self._entries[position] if position >= 0 else None
+
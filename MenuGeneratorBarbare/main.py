@@ -1,14 +1,23 @@
 import json
 from datetime import date, timedelta
 import locale
+import os
+import re
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Tuple
-
-from unidecode import unidecode
-
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from artifact_bundles import CLI_BUNDLE_ID, MAIL_FILENAME, MENU_FILENAME, BundleWriter
+from build_retention import ArtifactIndex
+from catalog_store import get_catalog_store
+from ingredient_index import IngredientIndex
+from menu_layout import is_landscape
+from metrics import time_stage
 from paths import get_build_dir
+from pillow_renderer import PillowRenderer
 from playwright_renderer import PlaywrightRenderer
-from style_config import load_style_config
+from render_cache import RenderCache, compute_render_key
+from renditions import RenditionSet
+from style_config import StyleSnapshot, get_style_snapshot
 
 # Constants
 PROJECT_ROOT = Path(__file__).resolve().parent
@@ -17,18 +26,38 @@ DEFAULT_LOGO_PATH = PROJECT_ROOT / DEFAULT_LOGO_FILENAME
 FONT_PATH = PROJECT_ROOT / "OpenSans-VariableFont_wdth,wght.ttf"
 SANDWICH_DIR = PROJECT_ROOT / "Sandwichlogo"
 OUTPUT_DIR = get_build_dir()
+RENDERER_BACKENDS = ("playwright", "pillow")
+RENDERER_BACKEND = os.getenv("MENU_RENDERER_BACKEND", "playwright")
+
+Renderer = Union[PlaywrightRenderer, PillowRenderer]
+
+
+def next_monday(today: Optional[date] = None) -> date:
+    """The Monday after ``today`` (a week later when ``today`` is a Monday)."""
+    today = today or date.today()
+    return today + timedelta(days=7 - today.weekday())
+
+
+def week_monday(day: date) -> date:
+    """The Monday of the week containing ``day``."""
+    return day - timedelta(days=day.weekday())
 
 class MenuGenerator:
-    def __init__(self) -> None:
+    def __init__(self, style: Optional[StyleSnapshot] = None) -> None:
+        """``style`` replaces the saved style configuration, e.g. for previews."""
         self.output_dir = OUTPUT_DIR
         self.ensure_output_directory()
         locale.setlocale(locale.LC_TIME, "fr_FR.utf8")
 
-        style_config = load_style_config()
+        snapshot = style if style is not None else get_style_snapshot()
+        style_config = snapshot.config
+        self.style_config = style_config
+        self.style_version = snapshot.version
         self.colors = style_config["colors"]
         self.layouts = self._prepare_layouts(style_config["layouts"])
         logo_value = (style_config.get("assets", {}) or {}).get("logo", DEFAULT_LOGO_FILENAME)
         self.logo_path, self.logo_warnings = self._resolve_logo_path(logo_value)
+        self.renditions = RenditionSet.from_env()
 
     def _prepare_layouts(self, layouts: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
         prepared: Dict[str, Dict[str, Any]] = {}
@@ -76,11 +105,8 @@ class MenuGenerator:
         """Ensure the output directory exists."""
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
-    def get_next_week_text(self) -> str:
-        """Return the date of the next Monday and Friday in French format."""
-        today = date.today()
-        days_ahead = 7 - today.weekday()
-        monday = today + timedelta(days=days_ahead)
+    def get_week_text(self, monday: date) -> str:
+        """Return the Monday and Friday of the week starting on ``monday`` in French format."""
         friday = monday + timedelta(days=4)
         return (
             "Semaine du "
@@ -89,6 +115,11 @@ class MenuGenerator:
             + friday.strftime("%d %B\n%Y")
         ).upper()
 
+    def get_next_week_text(self) -> str:
+        """Return the date of the next Monday and Friday in French format."""
+        return self.get_week_text(next_monday())
+
+    @time_stage("normalize")
     def _normalize_content(
         self, content: Iterable[Dict[str, Any]]
     ) -> Tuple[List[Dict[str, Any]], List[str]]:
@@ -120,6 +151,13 @@ class MenuGenerator:
 
         return normalized, warnings
 
+    def _layout_week_text(self, layout_name: str, week_text: str) -> str:
+        """Landscape layouts show the week range on a single line."""
+        if is_landscape(self.layouts[layout_name]):
+            return " ".join(week_text.split("\n"))
+        return week_text
+
+    @time_stage("build_cells")
     def _build_cells(
         self,
         layout_name: str,
@@ -146,6 +184,15 @@ class MenuGenerator:
 
         return cells
     
+    def _referenced_assets(self, days: List[Dict[str, Any]]) -> List[Path]:
+        """Files whose content ends up in the rendered images."""
+        assets = [FONT_PATH, self.logo_path]
+        for day in days:
+            for item in day["content"]:
+                if item["is_meal"] and item["img"].strip():
+                    assets.append(SANDWICH_DIR / f"{item['img'].strip()}.png")
+        return assets
+
     def transform_pascal_case(self, string):
         """Transform PascalCase to space-separated words"""
         if string == "RSAv":
@@ -160,13 +207,15 @@ class MenuGenerator:
         return " ".join(word.strip() for word in final)
     
     def find_ingredient(self, ingredients, name):
-        """Find ingredient information in the ingredients list"""
+        """Find ingredient information in the ingredients list or index"""
         if name.lower() == "pizza":
             return ("Pizza", "Pizza", "Pizza")
-            
-        for ingredient in ingredients:
-            if unidecode(name.lower()) in unidecode(ingredient[0].lower()):
-                return ingredient
+
+        if not isinstance(ingredients, IngredientIndex):
+            ingredients = IngredientIndex(ingredients)
+        ingredient = ingredients.find(name)
+        if ingredient is not None:
+            return ingredient
                 
         print(f"Not found: {name}")
         return (f"Not found:{name}", "", "")
@@ -188,11 +237,11 @@ class MenuGenerator:
                 
         return unique_meals
     
+    @time_stage("email")
     def generate_email_text(self, week_data):
         """Generate text for email with ingredient information"""
         # Load ingredients
-        with open(PROJECT_ROOT / "ingredients.json", encoding="utf8") as f:
-            ingredients = json.load(f)
+        ingredients = get_catalog_store().ingredient_index()
             
         unique_meals = self.flatten_meals(week_data)
         
@@ -223,153 +272,296 @@ class MenuGenerator:
         # Replace placeholders with custom text
         return text.replace("{text-custom-french}", week_data["text-custom-french"]).replace("{text-custom-english}", week_data["text-custom-english"])
     
-    def generate_menu(self, week_data, filename):
-        """Generate menu assets and return the image paths with the email text."""
-        normalized_content, normalization_warnings = self._normalize_content(
-            week_data.get("content", [])
-        )
-        normalized_week_data = dict(week_data)
-        normalized_week_data["content"] = normalized_content
-
-        week_text = self.get_next_week_text()
-        horizontal_week_text = " ".join(week_text.split("\n"))
-
-        vertical_cells = self._build_cells(
-            "vertical", week_data.get("header", []), normalized_content
-        )
-        horizontal_cells = self._build_cells(
-            "horizontal", week_data.get("header", []), normalized_content
-        )
-
-        renderer = PlaywrightRenderer(
+    def create_renderer(self, check: Optional[Callable[[], None]] = None) -> Renderer:
+        """A renderer for this generator's style; enter it to lease a browser.
+
+        ``check`` is called while waiting for a browser and during previews;
+        raising from it gives the render up.
+        """
+        if RENDERER_BACKEND not in RENDERER_BACKENDS:
+            raise ValueError(f"Unknown renderer backend '{RENDERER_BACKEND}', expected one of {RENDERER_BACKENDS}")
+        renderer_class = PillowRenderer if RENDERER_BACKEND == "pillow" else PlaywrightRenderer
+        return renderer_class(
             colors=self.colors,
             layouts=self.layouts,
             font_path=FONT_PATH,
             logo_path=self.logo_path,
             sandwich_dir=SANDWICH_DIR,
+            style_version=self.style_version,
+            check=check,
+        )
+
+    def render_preview(
+        self,
+        week_data,
+        layout_name: str,
+        *,
+        scale: float,
+        quality: int,
+        renderer: Optional[Renderer] = None,
+    ) -> Tuple[bytes, List[str]]:
+        """Render a single layout of the menu to a JPEG ``scale`` times its size.
+
+        Nothing is written: the image is returned with the render warnings.
+        ``renderer`` is an already entered renderer, as for ``generate_menu``.
+        """
+        normalized_content, warnings = self._normalize_content(week_data.get("content", []))
+        week_text = self._layout_week_text(layout_name, self.get_next_week_text())
+        cells = self._build_cells(layout_name, week_data.get("header", []), normalized_content)
+
+        with time_stage("preview"):
+            if renderer is not None:
+                image, render_warnings = renderer.render_preview(
+                    layout_name, week_text=week_text, cells=cells, scale=scale, quality=quality
+                )
+            else:
+                with self.create_renderer() as preview_renderer:
+                    image, render_warnings = preview_renderer.render_preview(
+                        layout_name, week_text=week_text, cells=cells, scale=scale, quality=quality
+                    )
+        return image, warnings + self.logo_warnings + render_warnings
+
+    def generate_menu(
+        self,
+        week_data,
+        filename=None,
+        *,
+        week_start: Optional[date] = None,
+        renderer: Optional[Renderer] = None,
+    ):
+        """Generate a menu bundle and return its images with the email text.
+
+        The images are returned as a ``{layout name: published PNG path}``
+        dict covering every configured layout.
+
+        ``filename`` is the bundle id; a unique one is generated when omitted.
+        The images, mailing text and menu are published together under
+        ``<build dir>/menus/<id>/``. The menu is dated for the week containing
+        ``week_start`` (next week by default). ``renderer`` is an already
+        entered renderer to reuse, e.g. across the weeks of a batch.
+        """
+        bundle = BundleWriter(self.output_dir, filename)
+        try:
+            return self._generate_bundle(week_data, bundle, week_start, renderer)
+        except BaseException:
+            bundle.discard()
+            raise
+
+    def _generate_bundle(
+        self,
+        week_data,
+        bundle: BundleWriter,
+        week_start: Optional[date] = None,
+        renderer: Optional[Renderer] = None,
+    ):
+        normalized_content, normalization_warnings = self._normalize_content(
+            week_data.get("content", [])
         )
+        normalized_week_data = dict(week_data)
+        normalized_week_data["content"] = normalized_content
 
-        vertical_path = self.output_dir / f"{filename}-vertical.png"
-        horizontal_path = self.output_dir / f"{filename}-horizontal.png"
+        if week_start is None:
+            week_text = self.get_next_week_text()
+        else:
+            week_text = self.get_week_text(week_monday(week_start))
+        headers = week_data.get("header", [])
+
+        # Every published file, the full-size PNGs and their renditions, by name.
+        output_paths: Dict[str, Path] = {}
+        jobs: List[Dict[str, Any]] = []
+        for layout_name, layout in self.layouts.items():
+            output_path = bundle.path(f"{layout_name}.png")
+            output_paths[output_path.name] = output_path
+            for name in self.renditions.names(layout_name, layout["image_size"][0]):
+                output_paths[name] = bundle.path(name)
+            jobs.append(
+                {
+                    "layout_name": layout_name,
+                    "week_text": self._layout_week_text(layout_name, week_text),
+                    "cells": self._build_cells(layout_name, headers, normalized_content),
+                    "output_path": output_path,
+                    "renditions": self.renditions,
+                }
+            )
 
         warnings: List[str] = list(normalization_warnings)
         warnings.extend(self.logo_warnings)
 
-        with renderer as browser_renderer:
-            warnings.extend(
-                browser_renderer.render_layout(
-                    "vertical",
-                    week_text=week_text,
-                    cells=vertical_cells,
-                    output_path=vertical_path,
-                )
-            )
-            warnings.extend(
-                browser_renderer.render_layout(
-                    "horizontal",
-                    week_text=horizontal_week_text,
-                    cells=horizontal_cells,
-                    output_path=horizontal_path,
-                )
-            )
+        render_key = compute_render_key(
+            normalized_content=normalized_content,
+            cells_by_layout={job["layout_name"]: job["cells"] for job in jobs},
+            style_config=self.style_config,
+            week_text=week_text,
+            asset_paths=self._referenced_assets(normalized_content),
+            renderer=RENDERER_BACKEND,
+            renditions=self.renditions.describe(),
+        )
+        cache = RenderCache()
+
+        if not cache.fetch(render_key, output_paths):
+            if renderer is not None:
+                warnings.extend(renderer.render_layouts(jobs))
+            else:
+                with self.create_renderer() as browser_renderer:
+                    warnings.extend(browser_renderer.render_layouts(jobs))
+            cache.store(render_key, output_paths)
 
         email_text = self.generate_email_text(normalized_week_data)
 
-        with open(self.output_dir / "mail.txt", "w", encoding="utf8") as file:
-            file.write(email_text)
+        with time_stage("write"):
+            with open(bundle.path(MAIL_FILENAME), "w", encoding="utf8") as file:
+                file.write(email_text)
+            with open(bundle.path(MENU_FILENAME), "w", encoding="utf8") as file:
+                json.dump(week_data, file, ensure_ascii=False)
+
+            published_dir = bundle.publish()
+            ArtifactIndex(self.output_dir).register(
+                bundle.bundle_id,
+                published_dir.iterdir(),
+                directory=published_dir,
+            )
 
         if warnings:
             print("\n".join(warnings))
 
-        return vertical_path, horizontal_path, email_text
+        images = {
+            layout_name: bundle.published_path(f"{layout_name}.png")
+            for layout_name in self.layouts
+        }
+        return images, email_text
+
+class Token(NamedTuple):
+    """A CLI word; quoted words are never read as options."""
+
+    value: str
+    quoted: bool = False
+
+
+# One word per match: a quoted string or a bare word. As before the tokenizer,
+# a quote only closes the string when followed by whitespace or the end of
+# the text, so ``"x"y"`` reads ``x"y``; the closing quote is optional and
+# escapes are allowed. The quoted body always runs to a closing quote or
+# the end of the text, so matching never backtracks.
+_TOKEN_PATTERN = re.compile(r'"((?:[^"\\]|\\.?|"(?!\s|$))*)(?:"|$)|([^\s"]\S*)', re.DOTALL)
+_ESCAPE_PATTERN = re.compile(r'\\(["\\])')
+
+
+def tokenize(text: str) -> List[Token]:
+    """Split a CLI string in a single pass.
+
+    Whitespace inside quotes is kept as is, and so is a quote not followed
+    by whitespace; ``\\"`` and ``\\\\`` stand for a quote and a backslash
+    inside quoted text.
+    """
+    tokens: List[Token] = []
+    for match in _TOKEN_PATTERN.finditer(text):
+        quoted, bare = match.groups()
+        if bare is not None:
+            tokens.append(Token(bare))
+        else:
+            tokens.append(Token(_ESCAPE_PATTERN.sub(r"\1", quoted), True))
+    return tokens
+
+
+def quote(text: str) -> str:
+    """Quote ``text`` so that ``tokenize`` reads it back unchanged."""
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
 
 class CLIParser:
     def __init__(self):
         pass
-        
-    def parse_string_argument(self, args, index):
-        """Parse a quoted string argument"""
-        string = ""
-        while index < len(args) and not args[index].endswith("\""):
-            string += args[index] + " "
-            index += 1
-            
-        if index < len(args):
-            string += args[index]
-            
-        return string[1:-1], index
-    
+
+    @staticmethod
+    def _is_option(token: Token, name: Optional[str] = None) -> bool:
+        if token.quoted or not token.value.startswith("--"):
+            return False
+        return name is None or token.value == name
+
+    @time_stage("parse")
     def parse_arguments(self, args):
-        """Parse command line arguments into a structured format"""
+        """Parse a CLI string (or its words) into a structured format"""
+        if not isinstance(args, str):
+            # Word lists come from splitting the CLI string on spaces.
+            args = " ".join(args)
+        tokens = tokenize(args)
+
         week_data = {
             "header": [],
             "text-custom-french": "",
             "text-custom-english": "",
             "content": []
         }
-        
+
+        count = len(tokens)
         i = 0
-        while i < len(args):
-            if args[i] == "--header":
-                header = []
+        while i < count:
+            token = tokens[i]
+            if self._is_option(token, "--header"):
                 i += 1
-                while i < len(args) and not args[i].startswith("--"):
-                    header.append(args[i])
+                header = []
+                while i < count and not self._is_option(tokens[i]):
+                    header.append(tokens[i].value)
                     i += 1
                 week_data["header"] = header
-                
-            elif args[i] == "--custom-text-french":
-                text, i = self.parse_string_argument(args, i+1)
+
+            elif self._is_option(token, "--custom-text-french") or self._is_option(token, "--custom-text-english"):
+                key = "text-custom-french" if token.value.endswith("french") else "text-custom-english"
+                if i + 1 < count and not self._is_option(tokens[i + 1]):
+                    week_data[key] = tokens[i + 1].value
+                    i += 1
                 i += 1
-                week_data["text-custom-french"] = text
-                
-            elif args[i] == "--custom-text-english":
-                text, i = self.parse_string_argument(args, i+1)
+
+            elif self._is_option(token, "--content"):
                 i += 1
-                week_data["text-custom-english"] = text
-                
-            elif args[i] == "--content":
-                day = {
-                    "day": args[i+2],
-                    "content": []
-                }
-                i += 3
-                
-                if args[i] == "--day-content":
+                label = ""
+                if i < count and self._is_option(tokens[i], "--day"):
                     i += 1
-                else:
-                    print(f"Error: --day-content is missing {args[i]}")
+                if i < count and not self._is_option(tokens[i]):
+                    label = tokens[i].value
+                    i += 1
+
+                if i < count and self._is_option(tokens[i], "--day-content"):
                     i += 1
+                else:
+                    missing = tokens[i].value if i < count else ""
+                    print(f"Error: --day-content is missing {missing}")
                     continue
-                    
-                while i < len(args) and args[i] != "--content":
-                    content = {
-                        "text": "",
-                        "is_meal": False
-                    }
-                    
-                    if args[i] == "--is-meal":
+
+                day = {"day": label, "content": []}
+                while i < count and not self._is_option(tokens[i], "--content"):
+                    content = {"text": "", "is_meal": False}
+                    consumed = i
+
+                    if self._is_option(tokens[i], "--is-meal"):
                         content["is_meal"] = True
                         i += 1
-                        
-                    if args[i] == "--text":
-                        text, i = self.parse_string_argument(args, i+1)
-                        content["text"] = text
+
+                    if i < count and self._is_option(tokens[i], "--text"):
+                        i += 1
+                        if i < count and not self._is_option(tokens[i]):
+                            content["text"] = tokens[i].value
+                            i += 1
+
+                    if i < count and self._is_option(tokens[i], "--img"):
+                        i += 1
+                        if i < count and not self._is_option(tokens[i]):
+                            content["img"] = tokens[i].value
+                            i += 1
+
+                    if i == consumed:
+                        # Not an item option: skip it rather than loop forever.
                         i += 1
-                    
-                    if i < len(args) and args[i] == "--img":
-                        content["img"] = args[i+1]
-                        i += 2
-                    
+                        continue
                     day["content"].append(content)
-                    
+
                 week_data["content"].append(day)
             else:
                 i += 1
-                
+
         return week_data
 
-def generate_img_from_args(args, filename="menu"):
+def generate_img_from_args(args, filename=CLI_BUNDLE_ID):
     """Main entry point for generating images from command line arguments"""
     parser = CLIParser()
     week_data = parser.parse_arguments(args)
@@ -379,8 +571,8 @@ def generate_img_from_args(args, filename="menu"):
 
 if __name__ == "__main__":
     with open(PROJECT_ROOT / "cli.txt", encoding="utf8") as f:
-        args = f.read().split()
-        
+        args = f.read()
+
     parser = CLIParser()
     week_data = parser.parse_arguments(args)
     
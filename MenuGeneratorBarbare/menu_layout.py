@@ -0,0 +1,71 @@
+"""Box metrics of a menu layout, shared by the renderer backends."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict
+
+
+def is_landscape(layout: Dict[str, Any]) -> bool:
+    """Whether ``layout`` is wider than tall; such layouts spread their cells out."""
+    width, height = layout["image_size"]
+    return int(width) > int(height)
+
+
+def meal_image_display_width(layout: Dict[str, Any], base_width: int) -> int:
+    """CSS width of a sandwich image in the given layout."""
+    if is_landscape(layout):
+        return min(base_width, max(140, int(int(layout["grid"]["cell_width"]) * 0.55)))
+    return base_width
+
+
+@dataclass(frozen=True)
+class LayoutMetrics:
+    """Spacing of the grid and of its cells, in pixels."""
+
+    grid_width: int
+    grid_top: int
+    cell_padding_y: int
+    cell_padding_x: int
+    cell_padding_bottom: int
+    header_gap: int
+    header_inner_gap: int
+    items_gap: int
+    image_width: int
+    image_title_gap: int
+    text_margin_bottom: int
+
+
+def layout_metrics(layout: Dict[str, Any], meal_image_width: int) -> LayoutMetrics:
+    """Landscape layouts spread their cells out; the others keep them compact."""
+    grid = layout["grid"]
+    content_spacing = int(layout.get("content_spacing", 30))
+    metrics = {
+        "grid_width": int(grid["cell_width"]) * int(grid["cols"]),
+        "grid_top": int(grid.get("y_start", 0)),
+        "cell_padding_y": 6,
+        "cell_padding_x": 0,
+        "cell_padding_bottom": 0,
+        "header_gap": 0,
+        "header_inner_gap": 0,
+        "items_gap": 0,
+        "image_width": meal_image_display_width(layout, meal_image_width),
+        "image_title_gap": 0,
+        "text_margin_bottom": 0,
+    }
+
+    if is_landscape(layout):
+        header_gap = max(10, content_spacing // 3)
+        cell_padding_y = max(8, header_gap // 3)
+        metrics.update(
+            header_gap=header_gap,
+            header_inner_gap=max(8, header_gap // 2),
+            items_gap=max(8, content_spacing // 3),
+            text_margin_bottom=max(6, content_spacing // 4),
+            cell_padding_y=cell_padding_y,
+            image_title_gap=2,
+            cell_padding_bottom=cell_padding_y + 12,
+            cell_padding_x=max(16, int(grid["cell_width"]) // 12),
+        )
+
+    return LayoutMetrics(**metrics)
@@ -0,0 +1,87 @@
+"""Validation of structured menus (the ``meal.json`` schema).
+
+A week menu is an object with a ``header`` (the day labels), the
+``text-custom-french`` and ``text-custom-english`` mailing texts and a
+``content`` list of days, each holding a ``day`` label and the ``content``
+items (``text``, ``is_meal`` and, for meals, ``img``) displayed for it.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_DAYS = 50
+MAX_ITEMS_PER_DAY = 10
+
+
+def _is_text(value: Any) -> bool:
+    return isinstance(value, str)
+
+
+def validate_week_data(payload: Any) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """Return the menu in the shape ``MenuGenerator.generate_menu`` expects, or the errors.
+
+    The mailing texts default to empty strings, like with the CLI format.
+    """
+    if not isinstance(payload, dict):
+        return None, ["Menu payload must be a JSON object"]
+
+    errors: List[str] = []
+
+    header = payload.get("header", [])
+    if not isinstance(header, list) or not all(_is_text(label) for label in header):
+        errors.append("'header' must be an array of strings")
+
+    for key in ("text-custom-french", "text-custom-english"):
+        if not _is_text(payload.get(key, "")):
+            errors.append(f"'{key}' must be a string")
+
+    content = payload.get("content")
+    days: List[Dict[str, Any]] = []
+    if not isinstance(content, list):
+        errors.append("'content' must be an array of days")
+    elif len(content) > MAX_DAYS:
+        errors.append(f"'content' must not hold more than {MAX_DAYS} days")
+    else:
+        for day_index, day in enumerate(content):
+            prefix = f"content[{day_index}]"
+            if not isinstance(day, dict):
+                errors.append(f"'{prefix}' must be an object")
+                continue
+            if not _is_text(day.get("day", "")):
+                errors.append(f"'{prefix}.day' must be a string")
+
+            items = day.get("content", [])
+            if not isinstance(items, list) or len(items) > MAX_ITEMS_PER_DAY:
+                errors.append(f"'{prefix}.content' must be an array of at most {MAX_ITEMS_PER_DAY} items")
+                continue
+
+            day_items = []
+            for item_index, item in enumerate(items):
+                item_prefix = f"{prefix}.content[{item_index}]"
+                if not isinstance(item, dict):
+                    errors.append(f"'{item_prefix}' must be an object")
+                    continue
+                if not _is_text(item.get("text", "")):
+                    errors.append(f"'{item_prefix}.text' must be a string")
+                if not isinstance(item.get("is_meal", False), bool):
+                    errors.append(f"'{item_prefix}.is_meal' must be a boolean")
+                if "img" in item and not _is_text(item["img"]):
+                    errors.append(f"'{item_prefix}.img' must be a string")
+
+                entry = {"text": item.get("text", ""), "is_meal": item.get("is_meal", False)}
+                if "img" in item:
+                    entry["img"] = item["img"]
+                day_items.append(entry)
+
+            days.append({"day": day.get("day", ""), "content": day_items})
+
+    if errors:
+        return None, errors
+
+    return {
+        "header": list(header),
+        "text-custom-french": payload.get("text-custom-french", ""),
+        "text-custom-english": payload.get("text-custom-english", ""),
+        "content": days,
+    }, []
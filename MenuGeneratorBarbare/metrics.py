@@ -0,0 +1,115 @@
+"""Prometheus metrics of the generation pipeline.
+
+Every stage of a generation is timed in the ``menu_stage_seconds``
+histogram, so a slow render can be attributed to Python (parsing, markup,
+encoding) or to Chromium (loading the page, screenshotting it).
+
+Under Gunicorn, ``PROMETHEUS_MULTIPROC_DIR`` must name a directory shared
+by the workers (``gunicorn.conf.py`` sets it up); ``/metrics`` then
+aggregates the samples of every worker, live or not.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from paths import get_build_dir
+
+# From a warm cache hit (a few ms) to a cold browser launch (seconds).
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    "menu_stage_seconds",
+    "Time spent in each stage of a menu generation.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+BROWSER_LAUNCHES = Counter(
+    "menu_browser_launches_total",
+    "Chromium instances launched by the renderer pool.",
+)
+ASSET_CACHE_REQUESTS = Counter(
+    "menu_asset_cache_requests_total",
+    "Lookups in the in-memory asset cache.",
+    ["result"],
+)
+RENDER_CACHE_REQUESTS = Counter(
+    "menu_render_cache_requests_total",
+    "Lookups in the render cache of rendered images.",
+    ["result"],
+)
+RENDER_QUEUE_DEPTH = Gauge(
+    "menu_render_queue_depth",
+    "Render jobs accepted and not finished yet.",
+    multiprocess_mode="livesum",
+)
+
+
+def time_stage(stage: str):
+    """Context manager (or decorator) timing ``stage`` into ``menu_stage_seconds``."""
+    return STAGE_SECONDS.labels(stage=stage).time()
+
+
+def _directory_size(root: Path) -> Tuple[int, int]:
+    """Total bytes and number of files below ``root``."""
+    total = files = 0
+    stack = [root]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+                    files += 1
+            except OSError:
+                continue
+    return total, files
+
+
+class BuildDirCollector(Collector):
+    """Size of the build directory, measured when the metrics are scraped."""
+
+    def __init__(self, build_dir: Optional[Path] = None) -> None:
+        self.build_dir = Path(build_dir) if build_dir is not None else get_build_dir()
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        total, files = _directory_size(self.build_dir)
+        yield GaugeMetricFamily("menu_build_dir_bytes", "Bytes stored in the build directory.", value=total)
+        yield GaugeMetricFamily("menu_build_dir_files", "Files stored in the build directory.", value=files)
+
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+_build_dir_collector = BuildDirCollector()
+if not MULTIPROCESS:
+    REGISTRY.register(_build_dir_collector)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """The exposition of every metric, aggregated across workers when multiprocess."""
+    if not MULTIPROCESS:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(_build_dir_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,4 +1,4 @@
-"""Path utilities for locating writable directories."""
+"""Path utilities for locating writable directories, and environment settings."""
 
 from __future__ import annotations
 
@@ -9,6 +9,22 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).resolve().parent
 
 
+def env_int(name: str, default: int) -> int:
+    """Read an integer from the environment, ignoring invalid values."""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """Read a number from the environment, ignoring invalid values."""
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
 def _resolve_base(path_value: str | None) -> Path:
     """Return a path located under the project unless already absolute."""
     if not path_value:
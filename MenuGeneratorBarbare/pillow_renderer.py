@@ -0,0 +1,445 @@
+"""Browser-free menu renderer drawing the layouts with Pillow.
+
+It follows the page laid out by ``PlaywrightRenderer`` (same positions,
+spacing and colors) without starting Chromium, for hosts that cannot
+afford a browser. Differences are limited to what CSS does and Pillow
+does not: notes are not slanted (the font has no italic axis) and text
+is wrapped at the layout's ``max_text_width``.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from image_derivatives import (
+    LOGO_DISPLAY_WIDTH,
+    derivative_widths,
+    get_derivative_dir,
+    get_logo_derivative_dir,
+    logo_widths,
+    select_image,
+)
+from menu_layout import LayoutMetrics, layout_metrics
+from metrics import time_stage
+from paths import env_int
+
+IMAGE_CACHE_SIZE = env_int("MENU_PILLOW_IMAGE_CACHE", 128)
+PNG_COMPRESS_LEVEL = env_int("MENU_PILLOW_PNG_COMPRESS_LEVEL", 1)
+# Run-length matching suits the flat colors of a menu: as small as the
+# default strategy and a little faster, whatever the level.
+PNG_COMPRESS_TYPE = zlib.Z_RLE
+RENDER_WORKERS = env_int("MENU_PILLOW_WORKERS", os.cpu_count() or 1)
+
+# Dimensions from the stylesheet of the browser page.
+TITLE_LINE_HEIGHT = 1.05
+WEEK_LINE_HEIGHT = 1.1
+ITEM_LINE_HEIGHT = 1.2
+SEPARATOR_HEIGHT = 5
+IMAGE_RADIUS = 12
+NOTE_FONT_SIZE = 14
+NOTE_BACKGROUND = (0, 0, 0, 89)
+
+# FreeType faces must not be shared between threads, so each thread keeps its own.
+_fonts = threading.local()
+
+# Long-lived render threads, so that their fonts are loaded once and not per render.
+_executor_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+
+# Scaled sandwich images and logos, keyed by (path, mtime, width).
+_images: "OrderedDict[Tuple[str, int, int], Image.Image]" = OrderedDict()
+_images_lock = threading.Lock()
+
+
+def _font(path: Path, size: int, weight: int) -> ImageFont.FreeTypeFont:
+    cache = getattr(_fonts, "cache", None)
+    if cache is None:
+        cache = _fonts.cache = {}
+    key = (str(path), size, weight)
+    font = cache.get(key)
+    if font is None:
+        font = ImageFont.truetype(str(path), size)
+        try:
+            font.set_variation_by_axes([weight, 100])
+        except (OSError, ValueError):
+            # Not a variable font: every weight uses the default one.
+            pass
+        cache[key] = font
+    return font
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Return the render threads of the current process, starting them on first use."""
+    global _executor, _executor_pid
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=max(1, RENDER_WORKERS), thread_name_prefix="menu-pillow")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _scaled_image(path: Path, width: int, *, radius: int = 0) -> Image.Image:
+    """``path`` resized to ``width`` (aspect ratio kept), with rounded corners."""
+    key = (str(path), path.stat().st_mtime_ns, width)
+    with _images_lock:
+        image = _images.get(key)
+        if image is not None:
+            _images.move_to_end(key)
+            return image
+
+    with Image.open(path) as source:
+        source = source.convert("RGBA")
+        height = max(1, round(source.height * width / source.width))
+        image = source.resize((width, height), Image.LANCZOS)
+    if radius:
+        mask = Image.new("L", image.size, 0)
+        ImageDraw.Draw(mask).rounded_rectangle((0, 0, width - 1, height - 1), radius, fill=255)
+        alpha = image.getchannel("A")
+        image.putalpha(Image.composite(alpha, mask, mask))
+
+    with _images_lock:
+        _images[key] = image
+        while len(_images) > IMAGE_CACHE_SIZE:
+            _images.popitem(last=False)
+    return image
+
+
+def _wrap(text: str, font: ImageFont.FreeTypeFont, max_width: int) -> List[str]:
+    """Greedy word wrap keeping explicit line breaks, like ``white-space: pre-line``."""
+    lines: List[str] = []
+    space = font.getlength(" ")
+    for paragraph in text.split("\n"):
+        line = ""
+        line_width = 0.0
+        for word in paragraph.split():
+            word_width = font.getlength(word)
+            if line and line_width + space + word_width > max_width:
+                lines.append(line)
+                line, line_width = word, word_width
+            elif line:
+                line, line_width = f"{line} {word}", line_width + space + word_width
+            else:
+                line, line_width = word, word_width
+        lines.append(line)
+    return lines
+
+
+def _line_boxes(font: ImageFont.FreeTypeFont, line_height: Optional[float]) -> Tuple[float, float]:
+    """Height of a line box and offset of its baseline; ``None`` is ``line-height: normal``."""
+    ascent, descent = font.getmetrics()
+    if line_height is None:
+        return float(ascent + descent), float(ascent)
+    box = font.size * line_height
+    return box, (box - ascent - descent) / 2 + ascent
+
+
+class PillowRenderer:
+    """Render menu layouts to images with Pillow, without a browser.
+
+    Has the interface of ``PlaywrightRenderer``; entering it is a no-op,
+    and ``check`` is only called between the steps of a preview.
+    """
+
+    def __init__(
+        self,
+        *,
+        colors: Dict[str, str],
+        layouts: Dict[str, Dict[str, Any]],
+        font_path: Path,
+        logo_path: Path,
+        sandwich_dir: Path,
+        meal_image_width: int = 250,
+        style_version: Optional[str] = None,
+        check: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.colors = colors
+        self.layouts = layouts
+        self.style_version = style_version
+        self._font_path = Path(font_path)
+        self._logo_path = Path(logo_path)
+        self._sandwich_dir = Path(sandwich_dir)
+        self._meal_image_width = meal_image_width
+        self._derivative_widths = derivative_widths(layouts, meal_image_width)
+        self._derivative_root = get_derivative_dir()
+        self._check = check
+
+    def __enter__(self) -> "PillowRenderer":
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        pass
+
+    def render_layout(
+        self,
+        layout_name: str,
+        *,
+        week_text: str,
+        cells: List[Dict[str, Any]],
+        output_path: Path,
+    ) -> List[str]:
+        return self.render_layouts(
+            [
+                {
+                    "layout_name": layout_name,
+                    "week_text": week_text,
+                    "cells": cells,
+                    "output_path": output_path,
+                }
+            ]
+        )
+
+    def render_layouts(self, jobs: Iterable[Dict[str, Any]]) -> List[str]:
+        """Render each job (see ``PlaywrightRenderer.render_layouts``) to its PNG file.
+
+        Encoding the PNG takes most of the time and releases the GIL, so
+        the layouts are rendered on the threads shared by every render.
+        """
+        results = list(_get_executor().map(self._render_job, jobs))
+        return [warning for layout_warnings in results for warning in layout_warnings]
+
+    def _render_job(self, job: Dict[str, Any]) -> List[str]:
+        output_path = Path(job["output_path"])
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with time_stage("draw"):
+            canvas, warnings = self._draw_layout(job["layout_name"], job["week_text"], job["cells"])
+        with time_stage("write"):
+            canvas.save(output_path, format="PNG", compress_level=PNG_COMPRESS_LEVEL, compress_type=PNG_COMPRESS_TYPE)
+        if job.get("renditions") is not None:
+            job["renditions"].write(canvas, output_path)
+        return warnings
+
+    def render_preview(
+        self,
+        layout_name: str,
+        *,
+        week_text: str,
+        cells: List[Dict[str, Any]],
+        scale: float,
+        quality: int,
+    ) -> Tuple[bytes, List[str]]:
+        """A JPEG of one layout at ``scale`` times its size, and the warnings."""
+        self._check_preview()
+        # Drawn on the render threads, whose fonts are already loaded.
+        canvas, warnings = _get_executor().submit(self._draw_layout, layout_name, week_text, cells).result()
+        self._check_preview()
+        if scale < 1:
+            size = (max(1, round(canvas.width * scale)), max(1, round(canvas.height * scale)))
+            canvas = canvas.resize(size, Image.BILINEAR, reducing_gap=2.0)
+        buffer = io.BytesIO()
+        canvas.save(buffer, format="JPEG", quality=quality)
+        return buffer.getvalue(), warnings
+
+    def _check_preview(self) -> None:
+        if self._check is not None:
+            self._check()
+
+    def _draw_layout(
+        self,
+        layout_name: str,
+        week_text: str,
+        cells: List[Dict[str, Any]],
+    ) -> Tuple[Image.Image, List[str]]:
+        layout = self.layouts[layout_name]
+        width, height = layout["image_size"]
+        grid = layout["grid"]
+        metrics = layout_metrics(layout, self._meal_image_width)
+
+        canvas = Image.new("RGB", (width, height), self.colors["background"])
+        draw = ImageDraw.Draw(canvas, "RGBA")
+
+        if self._logo_path.exists():
+            logo_path = select_image(
+                self._logo_path, LOGO_DISPLAY_WIDTH, logo_widths(), root=get_logo_derivative_dir()
+            )
+            logo = _scaled_image(logo_path, LOGO_DISPLAY_WIDTH)
+            canvas.paste(logo, (10, 10), logo)
+
+        title_font = _font(self._font_path, int(layout["title_font_size"]), 700)
+        title_lines = layout.get("title_text", "").split("\n")
+        title_x, title_y = layout["title_position"]
+        self._draw_lines(
+            draw, title_lines, title_font, TITLE_LINE_HEIGHT, title_x, title_y, self.colors["secondary"]
+        )
+
+        week_font = _font(self._font_path, int(layout["week_font_size"]), 600)
+        week_lines = week_text.upper().split("\n")
+        week_width = max(week_font.getlength(line) for line in week_lines)
+        week_height = len(week_lines) * _line_boxes(week_font, WEEK_LINE_HEIGHT)[0]
+        week_x, week_y = self._anchor(
+            layout.get("week_text_position", (0, 0)),
+            layout.get("week_text_anchor", "lt"),
+            week_width,
+            week_height,
+        )
+        self._draw_lines(draw, week_lines, week_font, WEEK_LINE_HEIGHT, week_x, week_y, self.colors["primary"])
+
+        warnings: List[str] = []
+        grid_left = (width - metrics.grid_width) / 2
+        cols = grid["cols"]
+        for index, cell in enumerate(cells):
+            row = index // cols
+            col = index % cols
+            left = grid_left + col * grid["cell_width"]
+            top = metrics.grid_top + row * grid["cell_height"]
+            background = self.colors["primary"] if (row + col) % 2 == 0 else self.colors["secondary"]
+            draw.rectangle(
+                (left, top, left + grid["cell_width"] - 1, top + grid["cell_height"] - 1), fill=background
+            )
+            label = cell.get("label") or f"Jour {index + 1}"
+            warnings.extend(
+                self._draw_cell(canvas, draw, layout, metrics, left, top, label, cell.get("items", []))
+            )
+
+        return canvas, warnings
+
+    def _draw_cell(
+        self,
+        canvas: Image.Image,
+        draw: ImageDraw.ImageDraw,
+        layout: Dict[str, Any],
+        metrics: LayoutMetrics,
+        left: float,
+        top: float,
+        label: str,
+        items: Iterable[Dict[str, Any]],
+    ) -> List[str]:
+        """Lay the cell out top to bottom, centered, as its flex column does."""
+        inner_width = layout["grid"]["cell_width"] - 2 * metrics.cell_padding_x
+        center = left + layout["grid"]["cell_width"] / 2
+        y = top + metrics.cell_padding_y
+
+        separator_width = inner_width - 20
+        label_font = _font(self._font_path, int(layout["day_font_size"]), 800)
+        label_lines = _wrap(label.upper(), label_font, inner_width)
+        for position in range(3):
+            if position:
+                y += metrics.header_inner_gap
+            if position == 1:
+                y = self._draw_lines(
+                    draw, label_lines, label_font, None, center, y, self.colors["text"], centered=True
+                )
+                continue
+            draw.rounded_rectangle(
+                (center - separator_width / 2, y, center + separator_width / 2, y + SEPARATOR_HEIGHT - 1),
+                radius=3,
+                fill=self.colors["background"],
+            )
+            y += SEPARATOR_HEIGHT
+        y += metrics.header_gap
+
+        text_font = _font(self._font_path, int(layout["content_font_size"]), 600)
+        text_width = min(inner_width, int(layout.get("max_text_width") or inner_width))
+        warnings: List[str] = []
+        for position, item in enumerate(items):
+            if position:
+                y += metrics.items_gap
+            text = (item.get("text") or "").strip()
+            blocks: List[Any] = []
+
+            if item.get("is_meal"):
+                image_code = (item.get("img") or "").strip()
+                if image_code:
+                    image_path = self._sandwich_dir / f"{image_code}.png"
+                    if image_path.exists():
+                        image_path = select_image(
+                            image_path,
+                            metrics.image_width,
+                            self._derivative_widths,
+                            root=self._derivative_root,
+                        )
+                        blocks.append(_scaled_image(image_path, metrics.image_width, radius=IMAGE_RADIUS))
+                    else:
+                        blocks.append(f"Image {image_code}.png manquante")
+                        warnings.append(
+                            f"Warning: image '{image_code}.png' introuvable pour '{text}' ({label})"
+                        )
+                else:
+                    blocks.append("Image non renseignée")
+                    warnings.append(f"Warning: aucun code image fourni pour '{text}' ({label})")
+
+            for index, block in enumerate(blocks):
+                if index:
+                    y += metrics.image_title_gap
+                if isinstance(block, Image.Image):
+                    canvas.paste(block, (round(center - block.width / 2), round(y)), block)
+                    y += block.height
+                else:
+                    y = self._draw_note(draw, block, center, y)
+
+            if text:
+                if blocks:
+                    y += metrics.image_title_gap
+                lines = _wrap(text, text_font, text_width)
+                y = self._draw_lines(
+                    draw, lines, text_font, ITEM_LINE_HEIGHT, center, y, self.colors["text"], centered=True
+                )
+                y += metrics.text_margin_bottom
+
+        return warnings
+
+    def _draw_note(self, draw: ImageDraw.ImageDraw, text: str, center: float, y: float) -> float:
+        """The missing-image badge; returns its bottom."""
+        font = _font(self._font_path, NOTE_FONT_SIZE, 400)
+        box, baseline = _line_boxes(font, None)
+        half_width = font.getlength(text) / 2 + 8
+        draw.rounded_rectangle(
+            (center - half_width, y, center + half_width, y + box + 4), radius=4, fill=NOTE_BACKGROUND
+        )
+        draw.text((center, y + 2 + baseline), text, font=font, fill=self.colors["background"], anchor="ms")
+        return y + box + 4
+
+    @staticmethod
+    def _draw_lines(
+        draw: ImageDraw.ImageDraw,
+        lines: List[str],
+        font: ImageFont.FreeTypeFont,
+        line_height: Optional[float],
+        x: float,
+        y: float,
+        fill: str,
+        *,
+        centered: bool = False,
+    ) -> float:
+        """Draw centered lines from ``y``; returns the bottom of the block.
+
+        ``x`` is the center of the lines when ``centered``, otherwise the
+        left of a block as wide as its widest line.
+        """
+        if not centered:
+            x += max(font.getlength(line) for line in lines) / 2
+        box, baseline = _line_boxes(font, line_height)
+        for line in lines:
+            draw.text((x, y + baseline), line, font=font, fill=fill, anchor="ms")
+            y += box
+        return y
+
+    @staticmethod
+    def _anchor(position: Tuple[int, int], anchor: str, width: float, height: float) -> Tuple[float, float]:
+        """Top left of a ``width`` x ``height`` block anchored at ``position``."""
+        x, y = position
+        anchor = anchor or "lt"
+        horizontal = anchor[0] if len(anchor) > 0 else "l"
+        vertical = anchor[1] if len(anchor) > 1 else "t"
+
+        if horizontal == "m":
+            x -= width / 2
+        elif horizontal == "r":
+            x -= width
+
+        if vertical == "m":
+            y -= height / 2
+        elif vertical == "b":
+            y -= height
+
+        return x, y
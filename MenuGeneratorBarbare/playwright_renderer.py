@@ -2,13 +2,59 @@
 
 from __future__ import annotations
 
+import asyncio
 import base64
+import hashlib
 import html
+import json
 import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from asset_cache import AssetCache, get_asset_cache
+from asset_server import get_asset_server
+from file_utils import atomic_write_bytes
+from image_derivatives import (
+    LOGO_DISPLAY_WIDTH,
+    derivative_widths,
+    get_derivative_dir,
+    get_logo_derivative_dir,
+    logo_widths,
+    select_image,
+)
+from menu_layout import layout_metrics
+from metrics import time_stage
+from renderer_pool import BrowserSlot, RendererPool, close_page, get_renderer_pool
+from renditions import RenditionSet
+
+ASSET_MODES = ("inline", "server")
+DEFAULT_ASSET_MODE = os.getenv("MENU_RENDERER_ASSET_MODE", "server")
+PAGE_MODES = ("fresh", "warm")
+DEFAULT_PAGE_MODE = os.getenv("MENU_RENDERER_PAGE_MODE", "warm")
+
+# Swaps the content of a warm page and resolves once it can be screenshotted:
+# the fonts the new text needs are loaded and every image is decoded.
+_PATCH_SCRIPT = """
+async ([weekHtml, cellsHtml]) => {
+    document.querySelector(".week").innerHTML = weekHtml;
+    document.querySelector(".grid").innerHTML = cellsHtml;
+    document.body.getBoundingClientRect();
+    await document.fonts.ready;
+    await Promise.all(Array.from(document.images, (image) => image.decode().catch(() => null)));
+}
+"""
 
-from playwright.sync_api import sync_playwright
+# Resolves once a freshly loaded page has its fonts and decoded images.
+_READY_SCRIPT = """
+async () => {
+    await document.fonts.ready;
+    await Promise.all(Array.from(document.images, (image) => image.decode().catch(() => null)));
+}
+"""
 
 
 def _to_data_uri(path: Path) -> str:
@@ -24,8 +70,52 @@ def _to_data_uri(path: Path) -> str:
     return f"data:{mime_type};base64,{encoded}"
 
 
+TEMPLATE_CACHE_SIZE = 32
+_WEEK_SLOT = "\x00menu-week\x00"
+_CELLS_SLOT = "\x00menu-cells\x00"
+
+
+@dataclass(frozen=True)
+class PageTemplate:
+    """The page of a layout around its two variable parts."""
+
+    head: str
+    middle: str
+    tail: str
+    image_width: int
+
+    def render(self, week_html: str, cells_html: str) -> str:
+        return "".join((self.head, week_html, self.middle, cells_html, self.tail))
+
+
+# Compiled once per (style version, layout, assets) and shared by every renderer.
+_templates: "OrderedDict[Tuple[Any, ...], PageTemplate]" = OrderedDict()
+_templates_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class _PageJob:
+    key: Tuple[Any, ...]
+    template: PageTemplate
+    week_html: str
+    cells_html: str
+    viewport: Dict[str, int]
+    output_path: Path
+    renditions: Optional[RenditionSet] = None
+
+
+def style_key(colors: Dict[str, str], layouts: Dict[str, Dict[str, Any]]) -> str:
+    """Identify a style configuration whose version is unknown."""
+    serialized = json.dumps({"colors": colors, "layouts": layouts}, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf8")).hexdigest()[:16]
+
+
 class PlaywrightRenderer:
-    """Render menu layouts to images using Playwright."""
+    """Render menu layouts to images using Playwright.
+
+    ``check`` is called while waiting for a browser and between the steps
+    of a preview; when it raises, the render is given up.
+    """
 
     def __init__(
         self,
@@ -36,30 +126,60 @@ class PlaywrightRenderer:
         logo_path: Path,
         sandwich_dir: Path,
         meal_image_width: int = 250,
+        pool: Optional[RendererPool] = None,
+        asset_cache: Optional[AssetCache] = None,
+        asset_mode: str = DEFAULT_ASSET_MODE,
+        style_version: Optional[str] = None,
+        page_mode: str = DEFAULT_PAGE_MODE,
+        check: Optional[Callable[[], None]] = None,
     ) -> None:
+        if asset_mode not in ASSET_MODES:
+            raise ValueError(f"Unknown asset mode '{asset_mode}', expected one of {ASSET_MODES}")
+        if page_mode not in PAGE_MODES:
+            raise ValueError(f"Unknown page mode '{page_mode}', expected one of {PAGE_MODES}")
+
         self.colors = colors
         self.layouts = layouts
-        self._font_data_uri = _to_data_uri(Path(font_path))
-        self._logo_data_uri = _to_data_uri(Path(logo_path))
+        self.asset_mode = asset_mode
+        self.page_mode = page_mode
+        # Names the compiled page templates; hashed when the caller has no version.
+        self._style_key = style_version or style_key(colors, layouts)
+        self._asset_cache = asset_cache if asset_cache is not None else get_asset_cache()
+        self._font_src = self._asset_src(Path(font_path))
+        self._logo_src = self._asset_src(
+            select_image(
+                Path(logo_path),
+                LOGO_DISPLAY_WIDTH,
+                logo_widths(),
+                root=get_logo_derivative_dir(),
+            )
+        )
         self._sandwich_dir = Path(sandwich_dir)
         self._meal_image_width = meal_image_width
+        self._derivative_widths = derivative_widths(layouts, meal_image_width)
+        self._derivative_root = get_derivative_dir()
+
+        self._pool = pool
+        self._slot: Optional[BrowserSlot] = None
+        self._check = check
 
-        self._playwright = None
-        self._browser = None
+    def _asset_src(self, path: Path) -> str:
+        """URL of an asset in the page: a data URI or a local asset server URL."""
+        if self.asset_mode == "server":
+            return get_asset_server().url_for(path)
+        return self._asset_cache.get("data-uri", path, _to_data_uri)
 
     def __enter__(self) -> "PlaywrightRenderer":
-        if self._browser is None:
-            self._playwright = sync_playwright().start()
-            self._browser = self._playwright.chromium.launch(headless=True)
+        if self._slot is None:
+            if self._pool is None:
+                self._pool = get_renderer_pool()
+            self._slot = self._pool.acquire(check=self._check)
         return self
 
     def __exit__(self, *_exc: object) -> None:
-        if self._browser is not None:
-            self._browser.close()
-            self._browser = None
-        if self._playwright is not None:
-            self._playwright.stop()
-            self._playwright = None
+        if self._slot is not None:
+            slot, self._slot = self._slot, None
+            self._pool.release(slot)
 
     def render_layout(
         self,
@@ -69,25 +189,171 @@ class PlaywrightRenderer:
         cells: List[Dict[str, Any]],
         output_path: Path,
     ) -> List[str]:
-        layout = self.layouts[layout_name]
-        width, height = layout["image_size"]
-        output_path = Path(output_path)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+        return self.render_layouts(
+            [
+                {
+                    "layout_name": layout_name,
+                    "week_text": week_text,
+                    "cells": cells,
+                    "output_path": output_path,
+                }
+            ]
+        )
 
-        if self._browser is None:
+    def render_layouts(self, jobs: Iterable[Dict[str, Any]]) -> List[str]:
+        """Render several layouts at once, one page per layout.
+
+        Each job carries the ``render_layout`` arguments (``layout_name``,
+        ``week_text``, ``cells`` and ``output_path``) and optionally the
+        ``renditions`` (a ``RenditionSet``) to encode from the screenshot.
+        The pages share the leased browser and are screenshotted
+        concurrently, so the wall time is close to the slowest layout rather
+        than the sum of all of them.
+        """
+        if self._slot is None:
             raise RuntimeError("PlaywrightRenderer must be entered as a context manager before rendering")
 
-        page = self._browser.new_page()
-        page.set_viewport_size({"width": width, "height": height})
+        pages: List[_PageJob] = []
+        warnings: List[str] = []
+        for job in jobs:
+            layout_name = job["layout_name"]
+            layout = self.layouts[layout_name]
+            width, height = layout["image_size"]
+            output_path = Path(job["output_path"])
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+
+            with time_stage("build_html"):
+                template = self._template(layout_name, layout)
+                week_html, cells_html, layout_warnings = self._render_content(
+                    template, layout, job["week_text"], job["cells"]
+                )
+            warnings.extend(layout_warnings)
+            pages.append(
+                _PageJob(
+                    key=(self._template_key(layout_name), width, height),
+                    template=template,
+                    week_html=week_html,
+                    cells_html=cells_html,
+                    viewport={"width": width, "height": height},
+                    output_path=output_path,
+                    renditions=job.get("renditions"),
+                )
+            )
 
-        markup, warnings = self._build_html(layout_name, layout, week_text, cells)
-        page.set_content(markup, wait_until="networkidle")
-        page.wait_for_timeout(100)
-        page.screenshot(path=str(output_path), full_page=False)
-        page.close()
+        if pages:
+            screenshots = self._slot.run(lambda _browser: self._screenshot_all(pages))
+            # Encoded here rather than on the slot loop, which other renders share.
+            for job, screenshot in zip(pages, screenshots):
+                with time_stage("write"):
+                    atomic_write_bytes(job.output_path, screenshot)
+                if job.renditions is not None:
+                    job.renditions.write(screenshot, job.output_path)
 
         return warnings
 
+    def render_preview(
+        self,
+        layout_name: str,
+        *,
+        week_text: str,
+        cells: List[Dict[str, Any]],
+        scale: float,
+        quality: int,
+    ) -> Tuple[bytes, List[str]]:
+        """A JPEG of one layout at ``scale`` times its size, and the warnings.
+
+        Previews are of styles nobody saved yet, so their page is compiled
+        outside the template cache and loaded in full on a warm page of a
+        context whose device scale factor is ``scale``.
+        """
+        if self._slot is None:
+            raise RuntimeError("PlaywrightRenderer must be entered as a context manager before rendering")
+
+        layout = self.layouts[layout_name]
+        width, height = layout["image_size"]
+        template = self._compile_template(layout_name, layout)
+        week_html, cells_html, warnings = self._render_content(template, layout, week_text, cells)
+        markup = template.render(week_html, cells_html)
+        viewport = {"width": width, "height": height}
+        screenshot = self._slot.run(lambda _browser: self._screenshot_preview(markup, viewport, scale, quality))
+        return screenshot, warnings
+
+    async def _screenshot_preview(self, markup: str, viewport: Dict[str, int], scale: float, quality: int) -> bytes:
+        key = ("preview", scale)
+        self._check_preview()
+        page = await self._slot.take_page(key)
+        if page is None:
+            context = await self._slot.shared_context(device_scale_factor=scale)
+            page = await context.new_page()
+
+        try:
+            await page.set_viewport_size(viewport)
+            await page.set_content(markup, wait_until="load")
+            await page.evaluate(_READY_SCRIPT)
+        except BaseException:
+            await close_page(page)
+            raise
+        try:
+            self._check_preview()
+        except BaseException:
+            # The page is fine, only this preview is no longer wanted.
+            await self._slot.keep_page(key, page)
+            raise
+        try:
+            screenshot = await page.screenshot(type="jpeg", quality=quality, full_page=False)
+        except BaseException:
+            await close_page(page)
+            raise
+        await self._slot.keep_page(key, page)
+        return screenshot
+
+    def _check_preview(self) -> None:
+        if self._check is not None:
+            self._check()
+
+    async def _screenshot_all(self, pages: List["_PageJob"]) -> List[bytes]:
+        screenshot = self._screenshot_warm if self.page_mode == "warm" else self._screenshot
+        return list(await asyncio.gather(*(screenshot(job) for job in pages)))
+
+    async def _screenshot(self, job: "_PageJob") -> bytes:
+        context = await self._slot.shared_context()
+        page = await context.new_page()
+        try:
+            await page.set_viewport_size(job.viewport)
+            with time_stage("set_content"):
+                await page.set_content(job.template.render(job.week_html, job.cells_html), wait_until="networkidle")
+                await page.wait_for_timeout(100)
+            with time_stage("screenshot"):
+                return await page.screenshot(full_page=False)
+        finally:
+            await page.close()
+
+    async def _screenshot_warm(self, job: "_PageJob") -> bytes:
+        """Patch the content of a page already holding the layout, then screenshot it."""
+        page = await self._slot.take_page(job.key)
+        if page is None:
+            context = await self._slot.shared_context()
+            page = await context.new_page()
+            try:
+                await page.set_viewport_size(job.viewport)
+                with time_stage("set_content"):
+                    await page.set_content(job.template.render("", ""), wait_until="load")
+            except BaseException:
+                await close_page(page)
+                raise
+
+        try:
+            with time_stage("patch"):
+                await page.evaluate(_PATCH_SCRIPT, [job.week_html, job.cells_html])
+            with time_stage("screenshot"):
+                screenshot = await page.screenshot(full_page=False)
+        except BaseException:
+            # A page in an unknown state is never reused.
+            await close_page(page)
+            raise
+        await self._slot.keep_page(job.key, page)
+        return screenshot
+
     def _build_html(
         self,
         layout_name: str,
@@ -95,36 +361,47 @@ class PlaywrightRenderer:
         week_text: str,
         cells: List[Dict[str, Any]],
     ) -> Tuple[str, List[str]]:
+        template = self._template(layout_name, layout)
+        week_html, cells_html, warnings = self._render_content(template, layout, week_text, cells)
+        return template.render(week_html, cells_html), warnings
+
+    def _render_content(
+        self,
+        template: "PageTemplate",
+        layout: Dict[str, Any],
+        week_text: str,
+        cells: List[Dict[str, Any]],
+    ) -> Tuple[str, str, List[str]]:
+        """Markup of the week text and of the cells, the slots of ``template``."""
+        cells_html, warnings = self._render_cells(
+            cells, layout["grid"], layout, image_width=template.image_width
+        )
+        week_html = html.escape(week_text).replace("\n", "<br>")
+        return week_html, cells_html, warnings
+
+    def _template_key(self, layout_name: str) -> Tuple[Any, ...]:
+        return (self._style_key, layout_name, self._font_src, self._logo_src, self._meal_image_width)
+
+    def _template(self, layout_name: str, layout: Dict[str, Any]) -> "PageTemplate":
+        key = self._template_key(layout_name)
+        with _templates_lock:
+            template = _templates.get(key)
+            if template is not None:
+                _templates.move_to_end(key)
+                return template
+
+        template = self._compile_template(layout_name, layout)
+        with _templates_lock:
+            _templates[key] = template
+            while len(_templates) > TEMPLATE_CACHE_SIZE:
+                _templates.popitem(last=False)
+        return template
+
+    def _compile_template(self, layout_name: str, layout: Dict[str, Any]) -> "PageTemplate":
+        """Lay out everything but the week text and the cells, which go in slots."""
         width, height = layout["image_size"]
         grid = layout["grid"]
-        content_spacing = int(layout.get("content_spacing", 30))
-        header_gap = 0
-        header_inner_gap = 0
-        cell_padding_y = 6
-        items_gap = 0
-        text_margin_bottom = 0
-        grid_width = int(grid["cell_width"]) * int(grid["cols"])
-        grid_top_margin = int(grid.get("y_start", 0))
-        image_width = self._meal_image_width
-        image_title_gap = 0
-        cell_padding_bottom = 0
-        cell_padding_x = 0
-
-        if layout_name.lower() == "horizontal":
-            header_gap = max(10, content_spacing // 3)
-            header_inner_gap = max(8, header_gap // 2)
-            image_width = min(
-                self._meal_image_width,
-                max(140, int(int(grid["cell_width"]) * 0.55)),
-            )
-            items_gap = max(8, content_spacing // 3)
-            text_margin_bottom = max(6, content_spacing // 4)
-            cell_padding_y = max(8, header_gap // 3)
-            image_title_gap = 2
-            cell_padding_bottom = cell_padding_y + 12
-            cell_padding_x = max(16, int(grid["cell_width"]) // 12)
-
-        cell_markup, warnings = self._render_cells(cells, grid, layout)
+        metrics = layout_metrics(layout, self._meal_image_width)
 
         week_anchor_style = self._anchor_style(
             layout.get("week_text_position", (0, 0)),
@@ -132,13 +409,12 @@ class PlaywrightRenderer:
         )
 
         title_text = html.escape(layout.get("title_text", "")).replace("\n", "<br>")
-        week_text_html = html.escape(week_text).replace("\n", "<br>")
 
         css = f"""
             <style>
             @font-face {{
                 font-family: 'MenuFont';
-                src: url('{self._font_data_uri}') format('truetype');
+                src: url('{self._font_src}') format('truetype');
                 font-display: swap;
             }}
 
@@ -167,7 +443,7 @@ class PlaywrightRenderer:
                 position: absolute;
                 left: 10px;
                 top: 10px;
-                width: 360px;
+                width: {LOGO_DISPLAY_WIDTH}px;
                 height: auto;
             }}
 
@@ -198,8 +474,8 @@ class PlaywrightRenderer:
 
             .grid {{
                 position: relative;
-                margin: {grid_top_margin}px auto 0;
-                width: {grid_width}px;
+                margin: {metrics.grid_top}px auto 0;
+                width: {metrics.grid_width}px;
                 display: grid;
                 grid-template-columns: repeat({grid['cols']}, {grid['cell_width']}px);
                 grid-auto-rows: {grid['cell_height']}px;
@@ -211,9 +487,9 @@ class PlaywrightRenderer:
                 flex-direction: column;
                 align-items: center;
                 justify-content: flex-start;
-                padding: {cell_padding_y}px {cell_padding_x}px {cell_padding_bottom}px;
+                padding: {metrics.cell_padding_y}px {metrics.cell_padding_x}px {metrics.cell_padding_bottom}px;
                 box-sizing: border-box;
-                gap: {header_gap}px;
+                gap: {metrics.header_gap}px;
                 font-size: {layout['content_font_size']}px;
                 color: {self.colors['text']};
             }}
@@ -223,7 +499,7 @@ class PlaywrightRenderer:
                 display: flex;
                 flex-direction: column;
                 align-items: center;
-                gap: {header_inner_gap}px;
+                gap: {metrics.header_inner_gap}px;
             }}
 
             .day-header .separator {{
@@ -245,14 +521,14 @@ class PlaywrightRenderer:
                 display: flex;
                 flex-direction: column;
                 align-items: center;
-                gap: {items_gap}px;
+                gap: {metrics.items_gap}px;
             }}
 
             .item {{
                 display: flex;
                 flex-direction: column;
                 align-items: center;
-                gap: {image_title_gap}px;
+                gap: {metrics.image_title_gap}px;
                 text-align: center;
                 width: 100%;
             }}
@@ -261,11 +537,11 @@ class PlaywrightRenderer:
                 white-space: pre-line;
                 line-height: 1.2;
                 font-weight: 600;
-                margin: 0 auto {text_margin_bottom}px;
+                margin: 0 auto {metrics.text_margin_bottom}px;
             }}
 
             .item.meal img {{
-                width: {image_width}px;
+                width: {metrics.image_width}px;
                 height: auto;
                 border-radius: 12px;
                 object-fit: contain;
@@ -293,23 +569,27 @@ class PlaywrightRenderer:
 </head>
 <body>
 <div class=\"container\">
-    <img class=\"logo\" src=\"{self._logo_data_uri}\" alt=\"Logo\" />
+    <img class=\"logo\" src=\"{self._logo_src}\" alt=\"Logo\" />
     <div class=\"title\">{title_text}</div>
-    <div class=\"week\">{week_text_html}</div>
+    <div class=\"week\">{_WEEK_SLOT}</div>
     <div class=\"grid\">
-        {cell_markup}
+        {_CELLS_SLOT}
     </div>
 </div>
 </body>
 </html>
 """
-        return markup, warnings
+        head, _, remainder = markup.partition(_WEEK_SLOT)
+        middle, _, tail = remainder.partition(_CELLS_SLOT)
+        return PageTemplate(head=head, middle=middle, tail=tail, image_width=metrics.image_width)
 
     def _render_cells(
         self,
         cells: List[Dict[str, Any]],
         grid: Dict[str, Any],
         layout: Dict[str, Any],
+        *,
+        image_width: int,
     ) -> Tuple[str, List[str]]:
         chunks: List[str] = []
         warnings: List[str] = []
@@ -330,6 +610,7 @@ class PlaywrightRenderer:
             items_html, item_warnings = self._render_items(
                 cell.get("items", []),
                 day_label=label_raw,
+                image_width=image_width,
             )
             warnings.extend(item_warnings)
 
@@ -354,6 +635,7 @@ class PlaywrightRenderer:
         items: Iterable[Dict[str, Any]],
         *,
         day_label: str,
+        image_width: int,
     ) -> Tuple[str, List[str]]:
         parts: List[str] = []
         warnings: List[str] = []
@@ -364,13 +646,19 @@ class PlaywrightRenderer:
 
             if item.get("is_meal"):
                 image_code = (item.get("img") or "").strip()
-                image_data_uri = None
+                image_src = None
                 missing_reason = ""
 
                 if image_code:
                     image_path = self._sandwich_dir / f"{image_code}.png"
                     if image_path.exists():
-                        image_data_uri = _to_data_uri(image_path)
+                        image_path = select_image(
+                            image_path,
+                            image_width,
+                            self._derivative_widths,
+                            root=self._derivative_root,
+                        )
+                        image_src = self._asset_src(image_path)
                     else:
                         missing_reason = f"Image {image_code}.png manquante"
                         warnings.append(
@@ -388,8 +676,8 @@ class PlaywrightRenderer:
                     else ""
                 )
                 image_tag = (
-                    f"<img src=\"{image_data_uri}\" alt=\"{html.escape(image_code)}\" />"
-                    if image_data_uri
+                    f"<img src=\"{html.escape(image_src)}\" alt=\"{html.escape(image_code)}\" />"
+                    if image_src
                     else ""
                 )
 
@@ -1,15 +1,22 @@
 import json
 
+from main import quote
 
-with open("meal.json", "r") as f:
+
+with open("meal.json", "r", encoding="utf8") as f:
     mealList = json.load(f)
 
-cli_string = f"--header {" ".join(mealList["header"])} --custom-text-french \"{mealList["text-custom-french"]}\" --custom-text-english \"{mealList["text-custom-english"]}\" "
+header = " ".join(mealList["header"])
+cli_string = (
+    f"--header {header} "
+    f"--custom-text-french {quote(mealList['text-custom-french'])} "
+    f"--custom-text-english {quote(mealList['text-custom-english'])} "
+)
 
 for day in mealList['content']:
     cli_string += f"--content --day {day['day']} --day-content "
     # for meal in day["content"]:
-    #     cli_string += f"{"--is-meal " if meal["is_meal"] else ""}" + f"--text \"{meal['text']}\" " + ("--img " + meal['img'] + " " if 'img' in meal else '' )
+    #     cli_string += ("--is-meal " if meal["is_meal"] else "") + f"--text {quote(meal['text'])} " + ("--img " + meal['img'] + " " if 'img' in meal else '' )
 
-with open("cli.txt", "w") as f:
-    f.write(cli_string)
\ No newline at end of file
+with open("cli.txt", "w", encoding="utf8") as f:
+    f.write(cli_string)
@@ -0,0 +1,167 @@
+"""Content-addressed cache of rendered menu images."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from metrics import RENDER_CACHE_REQUESTS
+from paths import env_int, get_build_dir
+
+# Bump when the renderer output changes for identical inputs (template, CSS...).
+RENDER_CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = env_int("MENU_RENDER_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+
+_digest_lock = threading.Lock()
+_digests: Dict[str, Tuple[int, int, str]] = {}
+
+
+def file_digest(path: Path) -> str:
+    """Return the SHA-256 of a file, memoized on its mtime and size."""
+    path = Path(path)
+    try:
+        stat = path.stat()
+    except OSError:
+        return "missing"
+
+    key = str(path)
+    with _digest_lock:
+        cached = _digests.get(key)
+    if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+
+    hasher = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+
+    with _digest_lock:
+        _digests[key] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def compute_render_key(
+    *,
+    normalized_content: List[Dict[str, Any]],
+    cells_by_layout: Dict[str, List[Dict[str, Any]]],
+    style_config: Dict[str, Any],
+    week_text: str,
+    asset_paths: Iterable[Path],
+    renderer: str = "playwright",
+    renditions: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Hash everything that influences the rendered pixels."""
+    assets = {str(Path(path)): file_digest(path) for path in sorted(set(asset_paths), key=str)}
+    payload = {
+        "version": RENDER_CACHE_VERSION,
+        "content": normalized_content,
+        "cells": cells_by_layout,
+        "style": style_config,
+        "week_text": week_text,
+        "assets": assets,
+        "renderer": renderer,
+        "renditions": renditions,
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf8")).hexdigest()
+
+
+def _link_or_copy(source: Path, target: Path) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if target.exists():
+        target.unlink()
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class RenderCache:
+    """Rendered images stored under ``<root>/<key>/<file name>``.
+
+    Entries are published atomically with a directory rename and evicted
+    least-recently-used first once the cache grows past ``max_bytes``. A hit
+    refreshes the entry mtime, which is what the eviction order relies on.
+    """
+
+    def __init__(self, root: Optional[Path] = None, *, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = Path(root) if root is not None else get_build_dir() / "render-cache"
+        self.max_bytes = max(0, int(max_bytes))
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key
+
+    def lookup(self, key: str, names: Iterable[str]) -> Optional[Dict[str, Path]]:
+        """Return the cached file of every name (``vertical.png``...), or None on a miss."""
+        entry = self._entry_dir(key)
+        paths = {name: entry / name for name in names}
+        if not paths or not all(path.is_file() for path in paths.values()):
+            return None
+        try:
+            os.utime(entry)
+        except OSError:
+            return None
+        return paths
+
+    def fetch(self, key: str, output_paths: Dict[str, Path]) -> bool:
+        """Materialize a cached entry at ``output_paths``; False on a miss."""
+        cached = self.lookup(key, output_paths.keys())
+        if cached is None:
+            RENDER_CACHE_REQUESTS.labels(result="miss").inc()
+            return False
+        try:
+            for name, output_path in output_paths.items():
+                _link_or_copy(cached[name], Path(output_path))
+        except OSError:
+            RENDER_CACHE_REQUESTS.labels(result="miss").inc()
+            return False
+        RENDER_CACHE_REQUESTS.labels(result="hit").inc()
+        return True
+
+    def store(self, key: str, rendered_paths: Dict[str, Path]) -> None:
+        """Add freshly rendered images, keyed by file name, then enforce the size bound."""
+        if self.max_bytes == 0:
+            return
+
+        staging = self.root / f".tmp-{uuid.uuid4().hex}"
+        try:
+            for name, path in rendered_paths.items():
+                _link_or_copy(Path(path), staging / name)
+            try:
+                os.rename(staging, self._entry_dir(key))
+            except OSError:
+                # Another worker published the same key first.
+                pass
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self) -> None:
+        entries: List[Tuple[float, int, Path]] = []
+        total = 0
+        for entry in self.root.iterdir():
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            try:
+                size = sum(child.stat().st_size for child in entry.iterdir())
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            entries.append((mtime, size, entry))
+            total += size
+
+        for _mtime, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
@@ -0,0 +1,222 @@
+"""Background render jobs for menu generation.
+
+Rendering holds a browser for a noticeable time, so requests submit a job
+and poll (or stream) its state instead of blocking a Gunicorn thread. Jobs
+run on a bounded thread pool in the worker that accepted them; their
+records are written to ``<build dir>/jobs/<id>.json`` so any worker can
+report their status.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from file_utils import atomic_write_json, atomic_write_text, file_lock, read_json
+from metrics import RENDER_QUEUE_DEPTH
+from paths import env_int, get_build_dir
+
+JOB_STATUSES = ("queued", "rendering", "done", "failed")
+TERMINAL_STATUSES = ("done", "failed")
+# Held by every worker while it looks up and claims the job of a menu.
+LOCK_FILENAME = ".jobs.lock"
+
+DEFAULT_WORKERS = env_int("MENU_RENDER_JOB_WORKERS", 1)
+DEFAULT_MAX_PENDING = env_int("MENU_RENDER_JOB_MAX_PENDING", 8)
+# A job not updated for this long is considered lost (its worker died).
+STALE_AFTER_SECONDS = env_int("MENU_RENDER_JOB_STALE_SECONDS", 300)
+JOB_TTL_SECONDS = env_int("MENU_RENDER_JOB_TTL_SECONDS", 24 * 3600)
+
+_JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when too many jobs are already waiting in this worker."""
+
+
+def job_key(week_data: Dict[str, Any]) -> str:
+    """Stable identifier of a submission, used to de-duplicate identical menus."""
+    encoded = json.dumps(week_data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf8")).hexdigest()
+
+
+def is_valid_job_id(job_id: str) -> bool:
+    return bool(_JOB_ID_PATTERN.match(job_id or ""))
+
+
+class RenderJobQueue:
+    """Bounded queue of render jobs with cross-worker status records."""
+
+    def __init__(
+        self,
+        runner: Callable[[Dict[str, Any]], Dict[str, Any]],
+        *,
+        workers: int = DEFAULT_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        store_dir: Optional[Path] = None,
+    ) -> None:
+        self._runner = runner
+        self.max_pending = max(1, int(max_pending))
+        self.store_dir = Path(store_dir) if store_dir is not None else get_build_dir() / "jobs"
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        (self.store_dir / "keys").mkdir(exist_ok=True)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, int(workers)),
+            thread_name_prefix="render-job",
+        )
+        self._condition = threading.Condition()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._pending = 0
+        self._last_prune = 0.0
+
+    def _job_path(self, job_id: str) -> Path:
+        return self.store_dir / f"{job_id}.json"
+
+    def _key_path(self, key: str) -> Path:
+        return self.store_dir / "keys" / key
+
+    @property
+    def depth(self) -> int:
+        """Jobs accepted by this worker that have not finished yet."""
+        with self._condition:
+            return self._pending
+
+    def submit(self, week_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a render, or return the in-flight job rendering the same menu."""
+        key = job_key(week_data)
+
+        # The file lock keeps two workers from both missing and both rendering the menu.
+        with self._condition, file_lock(self.store_dir / LOCK_FILENAME):
+            existing = self._in_flight(key)
+            if existing is not None:
+                return existing
+
+            if self._pending >= self.max_pending:
+                raise JobQueueFullError("Trop de générations en attente, réessayez dans quelques instants")
+
+            now = time.time()
+            record = {
+                "id": uuid.uuid4().hex,
+                "key": key,
+                "status": "queued",
+                "created_at": now,
+                "updated_at": now,
+                "result": None,
+                "error": None,
+            }
+            self._persist(record)
+            atomic_write_text(self._key_path(key), record["id"])
+            self._jobs[record["id"]] = record
+            self._pending += 1
+            RENDER_QUEUE_DEPTH.inc()
+
+        self._executor.submit(self._run, record["id"], week_data)
+        self._prune()
+        return dict(record)
+
+    def _in_flight(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            job_id = self._key_path(key).read_text(encoding="ascii").strip()
+        except OSError:
+            return None
+
+        record = self.get(job_id)
+        if record is None or record["status"] in TERMINAL_STATUSES:
+            return None
+        if time.time() - record["updated_at"] > STALE_AFTER_SECONDS:
+            return None
+        return record
+
+    def _run(self, job_id: str, week_data: Dict[str, Any]) -> None:
+        try:
+            self._update(job_id, status="rendering")
+            result = self._runner(week_data)
+        except Exception as exc:
+            self._update(job_id, status="failed", error=str(exc))
+        else:
+            self._update(job_id, status="done", result=result)
+        finally:
+            with self._condition:
+                self._pending -= 1
+                RENDER_QUEUE_DEPTH.dec()
+
+    def _update(self, job_id: str, **changes: Any) -> None:
+        with self._condition:
+            record = self._jobs[job_id]
+            record.update(changes)
+            record["updated_at"] = time.time()
+            self._persist(record)
+            if record["status"] in TERMINAL_STATUSES:
+                # Finished jobs are served from their record file from now on.
+                del self._jobs[job_id]
+            self._condition.notify_all()
+
+    def _persist(self, record: Dict[str, Any]) -> None:
+        atomic_write_json(self._job_path(record["id"]), record)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the job record, whichever worker runs it."""
+        if not is_valid_job_id(job_id):
+            return None
+        with self._condition:
+            record = self._jobs.get(job_id)
+            if record is not None:
+                return dict(record)
+        return read_json(self._job_path(job_id))
+
+    def wait(
+        self,
+        job_id: str,
+        timeout: Optional[float] = None,
+        *,
+        changed_from: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Block until a job finishes or ``timeout`` elapses; returns its latest record.
+
+        With ``changed_from``, also return as soon as the job leaves that status.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            record = self.get(job_id)
+            if record is None or record["status"] in TERMINAL_STATUSES:
+                return record
+            if changed_from is not None and record["status"] != changed_from:
+                return record
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return record
+
+            # Jobs of other workers are only visible through their record file.
+            with self._condition:
+                self._condition.wait(0.25 if remaining is None else min(0.25, remaining))
+
+    def _prune(self) -> None:
+        now = time.time()
+        if now - self._last_prune < 600:
+            return
+        self._last_prune = now
+
+        for path in self.store_dir.glob("*.json"):
+            try:
+                if now - path.stat().st_mtime > JOB_TTL_SECONDS:
+                    path.unlink()
+            except OSError:
+                continue
+        for path in (self.store_dir / "keys").iterdir():
+            try:
+                if now - path.stat().st_mtime > JOB_TTL_SECONDS:
+                    path.unlink()
+            except OSError:
+                continue
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,380 @@
+"""Process-wide pool of warm Chromium browsers shared by menu renders."""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, List, Optional, Tuple, TypeVar
+
+from playwright.async_api import Browser, BrowserContext, Page, Playwright, async_playwright
+
+from metrics import BROWSER_LAUNCHES
+from paths import env_int
+
+T = TypeVar("T")
+
+
+DEFAULT_POOL_SIZE = env_int("MENU_RENDERER_POOL_SIZE", 1)
+DEFAULT_MAX_RENDERS = env_int("MENU_RENDERER_MAX_RENDERS", 200)
+DEFAULT_MAX_MEMORY_MB = env_int("MENU_RENDERER_MAX_MEMORY_MB", 768)
+DEFAULT_LEASE_TIMEOUT = env_int("MENU_RENDERER_LEASE_TIMEOUT", 30)
+DEFAULT_RENDER_TIMEOUT = env_int("MENU_RENDERER_RENDER_TIMEOUT", 45)
+DEFAULT_WARM_PAGES = env_int("MENU_RENDERER_WARM_PAGES", 4)
+# Seconds between two calls of the ``check`` of a waiting ``acquire``.
+LEASE_CHECK_INTERVAL = 0.05
+
+
+async def close_page(page: Page) -> None:
+    """Close a page, ignoring a browser that is already gone."""
+    try:
+        await page.close()
+    except Exception:
+        pass
+
+
+def _process_rss_bytes(pid: int) -> int:
+    """Return the resident set size of a process, or 0 when unavailable."""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text(encoding="ascii", errors="ignore")
+    except OSError:
+        return 0
+
+    for line in status.splitlines():
+        if line.startswith("VmRSS:"):
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                return int(parts[1]) * 1024
+    return 0
+
+
+class BrowserSlot:
+    """A Chromium instance owned by a dedicated event loop thread.
+
+    Playwright objects are bound to the loop that created them, so every
+    interaction with the browser is funnelled through :meth:`run`.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        launch_options: Optional[Dict[str, Any]] = None,
+        *,
+        max_warm_pages: int = DEFAULT_WARM_PAGES,
+    ) -> None:
+        self.index = index
+        self.render_count = 0
+        self.launch_count = 0
+        self.needs_recycle = False
+        self._launch_options = dict(launch_options or {})
+        self._playwright: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+        # One context per device scale factor (a fixed few); 1 is the one renders use.
+        self._contexts: Dict[float, BrowserContext] = {}
+        # Idle pages kept for reuse, least recently parked first.
+        self._warm_pages: List[Tuple[Hashable, Page]] = []
+        self.max_warm_pages = max(0, int(max_warm_pages))
+        self._context_lock = asyncio.Lock()
+        self._launch_lock = asyncio.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run_loop,
+            name=f"menu-renderer-{index}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def run(
+        self,
+        factory: Callable[[Browser], Awaitable[T]],
+        *,
+        timeout: Optional[float] = DEFAULT_RENDER_TIMEOUT,
+    ) -> T:
+        """Run ``factory(browser)`` on the slot loop and wait for its result."""
+        future = asyncio.run_coroutine_threadsafe(self._call(factory), self._loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self.needs_recycle = True
+            raise
+
+    def call(self, factory: Callable[[], Awaitable[T]], *, timeout: Optional[float] = None) -> T:
+        """Run a coroutine on the slot loop without requiring a browser."""
+        future = asyncio.run_coroutine_threadsafe(factory(), self._loop)
+        return future.result(timeout)
+
+    async def _call(self, factory: Callable[[Browser], Awaitable[T]]) -> T:
+        browser = await self._ensure_browser()
+        self.render_count += 1
+        return await factory(browser)
+
+    async def _ensure_browser(self) -> Browser:
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+
+        # Concurrent renders on a cold slot must not each launch a browser.
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+
+            await self._close_browser()
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=True, **self._launch_options)
+            self.render_count = 0
+            self.launch_count += 1
+            BROWSER_LAUNCHES.inc()
+            self.needs_recycle = False
+            return self._browser
+
+    async def shared_context(self, device_scale_factor: float = 1) -> BrowserContext:
+        """Return the long-lived context of this browser.
+
+        Pages opened in it share Chromium's HTTP and decoded-resource caches,
+        so assets loaded by one render are reused by the next ones. Previews
+        get a context of their own per ``device_scale_factor``; contexts are
+        kept until the browser closes, so callers pass one of a few fixed
+        factors (see ``style_preview.PREVIEW_SCALES``). Must be awaited from
+        a coroutine running on the slot loop.
+        """
+        async with self._context_lock:
+            browser = await self._ensure_browser()
+            context = self._contexts.get(device_scale_factor)
+            if context is None:
+                context = await browser.new_context(device_scale_factor=device_scale_factor)
+                self._contexts[device_scale_factor] = context
+            return context
+
+    async def take_page(self, key: Hashable) -> Optional[Page]:
+        """Lease an idle page parked under ``key``, if there is one.
+
+        Must be awaited from a coroutine running on the slot loop.
+        """
+        for position in range(len(self._warm_pages) - 1, -1, -1):
+            page_key, page = self._warm_pages[position]
+            if page_key == key:
+                del self._warm_pages[position]
+                if not page.is_closed():
+                    return page
+        return None
+
+    async def keep_page(self, key: Hashable, page: Page) -> None:
+        """Park ``page`` for a later render with the same ``key``.
+
+        The oldest pages are closed beyond ``max_warm_pages``, as is a page
+        of a browser that has been replaced meanwhile.
+        """
+        if not any(page.context is context for context in self._contexts.values()):
+            await close_page(page)
+            return
+        self._warm_pages.append((key, page))
+        while len(self._warm_pages) > self.max_warm_pages:
+            _key, evicted = self._warm_pages.pop(0)
+            await close_page(evicted)
+
+    async def _close_browser(self) -> None:
+        self._contexts = {}
+        self._warm_pages = []
+        browser, self._browser = self._browser, None
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                # The browser may already be gone; a fresh one is launched on demand.
+                pass
+
+    async def _memory_bytes(self) -> Optional[int]:
+        if self._browser is None or not self._browser.is_connected():
+            return None
+
+        session = await self._browser.new_browser_cdp_session()
+        try:
+            info = await session.send("SystemInfo.getProcessInfo")
+        finally:
+            await session.detach()
+
+        pids = [int(process["id"]) for process in info.get("processInfo", []) if "id" in process]
+        return sum(_process_rss_bytes(pid) for pid in pids)
+
+    async def _shutdown(self) -> None:
+        await self._close_browser()
+        playwright, self._playwright = self._playwright, None
+        if playwright is not None:
+            await playwright.stop()
+
+    def launch(self) -> None:
+        """Start the browser ahead of the first render."""
+        self.call(self._ensure_browser)
+
+    def memory_bytes(self) -> Optional[int]:
+        """Return the combined RSS of the browser processes, when measurable."""
+        try:
+            return self.call(self._memory_bytes, timeout=5)
+        except Exception:
+            return None
+
+    def recycle(self) -> None:
+        """Close the browser; the next render launches a fresh one."""
+        self.call(self._close_browser)
+        self.render_count = 0
+        self.needs_recycle = False
+
+    def close(self) -> None:
+        """Shut the browser and the loop thread down."""
+        if not self._loop.is_running():
+            return
+        try:
+            self.call(self._shutdown, timeout=10)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+class RendererPool:
+    """A fixed number of warm browsers leased to renderers one at a time."""
+
+    def __init__(
+        self,
+        *,
+        size: int = DEFAULT_POOL_SIZE,
+        max_renders: int = DEFAULT_MAX_RENDERS,
+        max_memory_mb: int = DEFAULT_MAX_MEMORY_MB,
+        lease_timeout: float = DEFAULT_LEASE_TIMEOUT,
+        launch_options: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.size = max(1, int(size))
+        self.max_renders = max(0, int(max_renders))
+        self.max_memory_bytes = max(0, int(max_memory_mb)) * 1024 * 1024
+        self.lease_timeout = lease_timeout
+        self._slots: List[BrowserSlot] = [
+            BrowserSlot(index, launch_options) for index in range(self.size)
+        ]
+        self._idle: "queue.Queue[BrowserSlot]" = queue.Queue()
+        for slot in self._slots:
+            self._idle.put(slot)
+        self._closed = False
+
+    def acquire(self, check: Optional[Callable[[], None]] = None) -> BrowserSlot:
+        """Wait for an idle browser slot.
+
+        ``check`` is called while waiting and once a slot is free; when it
+        raises, the caller gives up without holding a slot.
+        """
+        if self._closed:
+            raise RuntimeError("Renderer pool has been shut down")
+        if check is None:
+            try:
+                return self._idle.get(timeout=self.lease_timeout)
+            except queue.Empty as exc:
+                raise RuntimeError("No browser available to render the menu, try again later") from exc
+
+        deadline = time.monotonic() + self.lease_timeout
+        while True:
+            check()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError("No browser available to render the menu, try again later")
+            try:
+                slot = self._idle.get(timeout=min(remaining, LEASE_CHECK_INTERVAL))
+            except queue.Empty:
+                continue
+            try:
+                check()
+            except BaseException:
+                self._idle.put(slot)
+                raise
+            return slot
+
+    def release(self, slot: BrowserSlot) -> None:
+        """Return a slot to the pool, recycling it when it is worn out."""
+        if self._should_recycle(slot):
+            try:
+                slot.recycle()
+            except Exception:
+                slot.needs_recycle = True
+        self._idle.put(slot)
+
+    @contextmanager
+    def lease(self) -> Iterator[BrowserSlot]:
+        slot = self.acquire()
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    def _should_recycle(self, slot: BrowserSlot) -> bool:
+        if slot.needs_recycle:
+            return True
+        if self.max_renders and slot.render_count >= self.max_renders:
+            return True
+        if self.max_memory_bytes:
+            used = slot.memory_bytes()
+            if used is not None and used > self.max_memory_bytes:
+                return True
+        return False
+
+    def warm(self) -> None:
+        """Launch every browser now instead of on first use."""
+        for slot in self._slots:
+            slot.launch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "launches": sum(slot.launch_count for slot in self._slots),
+            "renders": [slot.render_count for slot in self._slots],
+        }
+
+    def shutdown(self) -> None:
+        """Close every browser; safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+        for slot in self._slots:
+            slot.close()
+
+
+_pool_lock = threading.Lock()
+_pool: Optional[RendererPool] = None
+_pool_pid: Optional[int] = None
+
+
+def get_renderer_pool() -> RendererPool:
+    """Return the pool of the current process, creating it on first use.
+
+    Gunicorn forks workers, so a pool inherited from another process is
+    discarded and each worker gets its own browsers.
+    """
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = RendererPool()
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def shutdown_renderer_pool() -> None:
+    """Close the pool of the current process if one was started."""
+    global _pool
+
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None and _pool_pid == os.getpid():
+        pool.shutdown()
+
+
+atexit.register(shutdown_renderer_pool)
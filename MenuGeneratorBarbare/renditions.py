@@ -0,0 +1,179 @@
+"""Compact renditions of the rendered menus.
+
+Besides the full-size PNG written by the renderer, every layout is
+published in lossy formats (WebP and JPEG by default, AVIF when Pillow
+supports it) and as thumbnails at the preview widths, all encoded in
+parallel from the image already in memory. ``<layout>.<ext>`` is the
+full-size image and ``<layout>-<width>w.<ext>`` a thumbnail. The image
+endpoints choose one with the ``Accept`` header and a ``width`` parameter.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from PIL import Image, features
+
+from file_utils import atomic_write_bytes
+from metrics import time_stage
+from paths import env_int
+
+# Format: (Pillow format, extension, MIME type), lossy ones by order of preference.
+FORMATS = {
+    "avif": ("AVIF", "avif", "image/avif"),
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "png": ("PNG", "png", "image/png"),
+}
+MIMETYPES = {extension: mimetype for _format, extension, mimetype in FORMATS.values()}
+_THUMBNAIL_PATTERN = re.compile(r"-(\d+)w$")
+
+
+def _env_list(name: str, default: str) -> List[str]:
+    return [value.strip().lower() for value in os.getenv(name, default).split(",") if value.strip()]
+
+
+def supported_formats() -> List[str]:
+    """The formats this Pillow build can encode."""
+    return [name for name in FORMATS if name in ("jpeg", "png") or features.check(name)]
+
+
+def rendition_name(layout_name: str, extension: str, width: Optional[int] = None) -> str:
+    if width is None:
+        return f"{layout_name}.{extension}"
+    return f"{layout_name}-{width}w.{extension}"
+
+
+@dataclass(frozen=True)
+class RenditionSet:
+    """The lossy formats, thumbnail widths and quality of the renditions."""
+
+    formats: Tuple[str, ...] = ("webp", "jpeg")
+    widths: Tuple[int, ...] = (360, 720)
+    quality: int = 80
+    workers: int = os.cpu_count() or 1
+
+    @classmethod
+    def from_env(cls) -> "RenditionSet":
+        """Configured by ``MENU_RENDITION_FORMATS``, ``_WIDTHS``, ``_QUALITY`` and ``_WORKERS``.
+
+        Formats this Pillow build cannot encode are skipped with a warning.
+        """
+        supported = supported_formats()
+        formats = []
+        for name in _env_list("MENU_RENDITION_FORMATS", "webp,jpeg"):
+            if name == "png":
+                continue
+            if name not in supported:
+                print(f"Warning: rendition format '{name}' is not supported by Pillow, skipping it")
+                continue
+            formats.append(name)
+
+        widths = []
+        for value in _env_list("MENU_RENDITION_WIDTHS", "360,720"):
+            if value.isdigit() and int(value) > 0:
+                widths.append(int(value))
+
+        return cls(
+            formats=tuple(formats),
+            widths=tuple(sorted(set(widths))),
+            quality=min(100, max(1, env_int("MENU_RENDITION_QUALITY", 80))),
+            workers=max(1, env_int("MENU_RENDITION_WORKERS", os.cpu_count() or 1)),
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        """What the renditions depend on, for the render cache key."""
+        return {"formats": list(self.formats), "widths": list(self.widths), "quality": self.quality}
+
+    def _targets(self, layout_name: str, image_width: int) -> List[Tuple[str, Optional[int], str]]:
+        """(format, width, file name) of every rendition but the full-size PNG.
+
+        Thumbnails at least as wide as the image would only be copies of it.
+        """
+        targets = [(name, None, rendition_name(layout_name, FORMATS[name][1])) for name in self.formats]
+        for width in self.widths:
+            if width >= image_width:
+                continue
+            for name in ("png",) + self.formats:
+                targets.append((name, width, rendition_name(layout_name, FORMATS[name][1], width)))
+        return targets
+
+    def names(self, layout_name: str, image_width: int) -> List[str]:
+        """File names of the renditions of a layout ``image_width`` pixels wide."""
+        return [name for _format, _width, name in self._targets(layout_name, image_width)]
+
+    @time_stage("renditions")
+    def write(self, image: Union[Image.Image, bytes], output_path: Path) -> List[Path]:
+        """Encode the renditions of ``image`` next to its full-size PNG ``output_path``."""
+        output_path = Path(output_path)
+        if isinstance(image, bytes):
+            with Image.open(io.BytesIO(image)) as decoded:
+                image = decoded.convert("RGB")
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        targets = self._targets(output_path.stem, image.width)
+        if not targets:
+            return []
+
+        scaled = {
+            width: image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            for _name, width, _filename in targets
+            if width is not None
+        }
+
+        def encode(target: Tuple[str, Optional[int], str]) -> Path:
+            name, width, filename = target
+            source = image if width is None else scaled[width]
+            buffer = io.BytesIO()
+            pillow_format = FORMATS[name][0]
+            if pillow_format == "PNG":
+                source.save(buffer, format="PNG", compress_level=6)
+            else:
+                source.save(buffer, format=pillow_format, quality=self.quality)
+            path = output_path.with_name(filename)
+            atomic_write_bytes(path, buffer.getvalue())
+            return path
+
+        # Encoders release the GIL, so the renditions are encoded side by side.
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(targets)), thread_name_prefix="menu-rendition") as executor:
+            return list(executor.map(encode, targets))
+
+
+def select_rendition(
+    full_size: Path,
+    accepted: Iterable[str],
+    width: Optional[int] = None,
+) -> Path:
+    """The rendition of ``full_size`` (a ``<layout>.png``) to serve.
+
+    ``width`` picks the smallest thumbnail at least that wide (the full-size
+    image when none is), and the most compact format whose MIME type is
+    listed in ``accepted`` wins; PNG is served otherwise, including for ``*/*``.
+    """
+    full_size = Path(full_size)
+    directory, layout_name = full_size.parent, full_size.stem
+    accepted = set(accepted)
+
+    size: Optional[int] = None
+    if width:
+        thumbnails = sorted(
+            int(match.group(1))
+            for match in (_THUMBNAIL_PATTERN.search(path.stem) for path in directory.glob(f"{layout_name}-*w.png"))
+            if match
+        )
+        size = next((candidate for candidate in thumbnails if candidate >= width), None)
+
+    for name, (_format, extension, mimetype) in FORMATS.items():
+        if name != "png" and mimetype not in accepted:
+            continue
+        candidate = directory / rendition_name(layout_name, extension, size)
+        if candidate.is_file():
+            return candidate
+    return full_size
@@ -0,0 +1,314 @@
+"""Bulk sandwich import.
+
+A batch is a manifest (JSON or CSV) describing sandwiches with the same
+fields as ``/addSandwich`` plus the images it refers to, uploaded either
+as a zip archive or as multipart files. Every item is validated before
+anything is written. The images are then decoded and re-encoded (with
+their derivatives) in a process pool, and all the valid items are
+added to the catalog in one transaction. Images are converted into staging
+directories and only those of the committed items are moved into place,
+so a failed or conflicting commit never leaves or overwrites a file. The
+result is a per-item report.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image, UnidentifiedImageError
+
+from catalog_store import CatalogStore, normalize_image_code, normalize_key, sandwich_entries
+from file_utils import atomic_write_bytes
+from image_derivatives import SANDWICH_DIR, derivative_path, generate_derivatives
+from paths import env_int
+
+MANIFEST_NAMES = ("manifest.json", "manifest.csv")
+TRUE_VALUES = {"true", "1", "yes", "on", "oui"}
+CONFLICT_MESSAGES = {
+    "name": "Ce nom de sandwich existe déjà",
+    "image": "Ce code image est déjà utilisé",
+}
+MAX_ITEMS = env_int("MENU_IMPORT_MAX_ITEMS", 1000)
+MAX_BYTES = env_int("MENU_IMPORT_MAX_BYTES", 200 * 1024 * 1024)
+IMPORT_WORKERS = env_int("MENU_IMPORT_WORKERS", os.cpu_count() or 1)
+
+
+class BatchImportError(ValueError):
+    """The batch as a whole is unusable (bad manifest, archive or size)."""
+
+
+def parse_manifest(filename: str, data: bytes) -> List[Dict[str, Any]]:
+    """Read the items of a JSON (list, or ``{"items": [...]}``) or CSV manifest."""
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError as exc:
+        raise BatchImportError("Le manifeste doit être encodé en UTF-8") from exc
+
+    if filename.lower().endswith(".csv"):
+        items: Any = list(csv.DictReader(io.StringIO(text)))
+    else:
+        try:
+            items = json.loads(text)
+        except json.JSONDecodeError as exc:
+            raise BatchImportError("Le manifeste JSON est invalide") from exc
+        if isinstance(items, dict):
+            items = items.get("items")
+
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise BatchImportError("Le manifeste doit contenir une liste de sandwichs")
+    if not items:
+        raise BatchImportError("Le manifeste est vide")
+    if len(items) > MAX_ITEMS:
+        raise BatchImportError(f"Le manifeste dépasse {MAX_ITEMS} sandwichs")
+    return items
+
+
+def read_archive(stream) -> Tuple[List[Dict[str, Any]], Dict[str, bytes]]:
+    """Manifest items and images (keyed by file name) of a zip archive."""
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile as exc:
+        raise BatchImportError("L'archive n'est pas un fichier zip valide") from exc
+
+    with archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if sum(info.file_size for info in members) > MAX_BYTES:
+            raise BatchImportError("L'archive est trop volumineuse")
+
+        manifest = None
+        files: Dict[str, bytes] = {}
+        for info in members:
+            # Only the base name is kept: entries never map outside the batch.
+            name = Path(info.filename).name
+            if not name or name.startswith("."):
+                continue
+            if name.lower() in MANIFEST_NAMES:
+                manifest = (name, archive.read(info))
+            else:
+                files[name] = archive.read(info)
+
+    if manifest is None:
+        raise BatchImportError("L'archive ne contient pas de manifest.json ou manifest.csv")
+    return parse_manifest(*manifest), files
+
+
+def read_uploads(manifest, images) -> Tuple[List[Dict[str, Any]], Dict[str, bytes]]:
+    """Manifest items and images (keyed by file name) of multipart uploads.
+
+    The uploads share the ``MAX_BYTES`` budget of an archive and are never
+    read past it.
+    """
+    remaining = MAX_BYTES
+
+    def read(upload) -> bytes:
+        nonlocal remaining
+        data = upload.stream.read(remaining + 1)
+        if len(data) > remaining:
+            raise BatchImportError("Les fichiers envoyés sont trop volumineux")
+        remaining -= len(data)
+        return data
+
+    items = parse_manifest(manifest.filename, read(manifest))
+    files: Dict[str, bytes] = {}
+    for upload in images:
+        # Only the base name is kept, as for archive entries.
+        name = Path(upload.filename or "").name
+        if name:
+            files[name] = read(upload)
+    return items, files
+
+
+def _text(item: Dict[str, Any], key: str) -> str:
+    value = item.get(key)
+    return str(value).strip() if value is not None else ""
+
+
+def _flag(item: Dict[str, Any], key: str) -> bool:
+    value = item.get(key)
+    if isinstance(value, bool):
+        return value
+    return _text(item, key).lower() in TRUE_VALUES
+
+
+def convert_image(data: bytes, target: str, widths: Sequence[int], root: str) -> Optional[str]:
+    """Store ``data`` as the RGBA PNG ``target`` and derive it; runs in the pool.
+
+    Returns an error message instead of raising so the batch carries on.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            image = source.convert("RGBA")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        return "Le fichier envoyé n'est pas une image valide"
+
+    buffer = io.BytesIO()
+    try:
+        image.save(buffer, format="PNG")
+        atomic_write_bytes(Path(target), buffer.getvalue())
+    except OSError:
+        return "Impossible d'enregistrer l'image du sandwich"
+
+    try:
+        generate_derivatives(Path(target), widths, Path(root), image=image)
+    except Exception as exc:
+        # The renderer falls back on the full-size image.
+        print(f"Warning: unable to derive '{Path(target).name}': {exc}")
+    return None
+
+
+class SandwichImport:
+    """Validate, convert and commit one batch."""
+
+    def __init__(
+        self,
+        catalog: CatalogStore,
+        *,
+        widths: Sequence[int],
+        derivative_root: Path,
+        sandwich_dir: Path = SANDWICH_DIR,
+        workers: int = IMPORT_WORKERS,
+    ) -> None:
+        self.catalog = catalog
+        self.widths = list(widths)
+        self.derivative_root = Path(derivative_root)
+        self.sandwich_dir = Path(sandwich_dir)
+        self.workers = max(1, workers)
+
+    def _validate(
+        self,
+        items: List[Dict[str, Any]],
+        files: Dict[str, bytes],
+        report: List[Dict[str, Any]],
+    ) -> List[Tuple[int, Dict[str, Any], List[str], Optional[bytes]]]:
+        """Return ``(position, meal, ingredient, image bytes)`` of the valid items."""
+        files_by_stem = {normalize_key(Path(name).stem): name for name in files}
+        seen: Dict[str, set] = {"name": set(), "image": set()}
+        valid = []
+
+        for position, item in enumerate(items):
+            entry = report[position]
+            name = _text(item, "name")
+            file_name = _text(item, "imageFile")
+            image_code = normalize_image_code(_text(item, "image")) or normalize_image_code(file_name)
+            entry["name"] = name
+            entry["image"] = image_code
+
+            if file_name and Path(file_name).name not in files:
+                entry["message"] = f"Fichier image introuvable dans le lot : {file_name}"
+                continue
+            if not file_name:
+                # Images may simply be named after their code.
+                file_name = files_by_stem.get(normalize_key(image_code), "")
+
+            if not name:
+                entry["message"] = "Le nom du sandwich est requis"
+                continue
+            if not image_code:
+                entry["message"] = "Un code image ou un fichier valide est requis"
+                continue
+
+            meal, ingredient = sandwich_entries(
+                name,
+                image_code,
+                _text(item, "frenchDescription"),
+                _text(item, "englishDescription"),
+                _flag(item, "isVegetarian"),
+            )
+            conflict = self.catalog.find_conflict(meal)
+            if conflict is None:
+                conflict = next((field for field in seen if normalize_key(meal[field]) in seen[field]), None)
+            if conflict is not None:
+                entry["message"] = CONFLICT_MESSAGES[conflict]
+                continue
+            for field in seen:
+                seen[field].add(normalize_key(meal[field]))
+
+            data = files[Path(file_name).name] if file_name else None
+            valid.append((position, meal, ingredient, data))
+        return valid
+
+    def _convert(self, valid, report: List[Dict[str, Any]], image_dir: Path, derivative_root: Path):
+        """Write the images of ``valid`` in parallel; returns the items whose image was saved."""
+        jobs = [(position, data) for position, _meal, _ingredient, data in valid if data is not None]
+        errors: Dict[int, Optional[str]] = {}
+        if jobs:
+            # Spawned rather than forked: the worker runs browser and job threads.
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs)), mp_context=context) as pool:
+                futures = {
+                    position: pool.submit(
+                        convert_image,
+                        data,
+                        str(image_dir / f"{report[position]['image']}.png"),
+                        self.widths,
+                        str(derivative_root),
+                    )
+                    for position, data in jobs
+                }
+                errors = {position: future.result() for position, future in futures.items()}
+
+        converted = []
+        for position, meal, ingredient, _data in valid:
+            if errors.get(position):
+                report[position]["message"] = errors[position]
+                continue
+            converted.append((position, meal, ingredient))
+        return converted
+
+    def _publish(self, image_code: str, image_dir: Path, derivative_root: Path) -> None:
+        """Move the staged image of a committed item and its derivatives into place."""
+        staged = image_dir / f"{image_code}.png"
+        if not staged.exists():
+            # Items without an image reuse one already in place.
+            return
+        target = self.sandwich_dir / staged.name
+        try:
+            os.replace(staged, target)
+            for width in self.widths:
+                derivative = derivative_path(staged, width, derivative_root)
+                if derivative.exists():
+                    destination = derivative_path(target, width, self.derivative_root)
+                    destination.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(derivative, destination)
+        except OSError as exc:
+            # The renderer falls back on the full-size image, or the default one.
+            print(f"Warning: unable to publish '{staged.name}': {exc}")
+
+    def run(self, items: List[Dict[str, Any]], files: Dict[str, bytes]) -> Dict[str, Any]:
+        """Import ``items``; raises ``CatalogError`` if the catalog cannot be written."""
+        report: List[Dict[str, Any]] = [{"index": position, "status": "error"} for position in range(len(items))]
+        valid = self._validate(items, files, report)
+
+        self.sandwich_dir.mkdir(parents=True, exist_ok=True)
+        self.derivative_root.mkdir(parents=True, exist_ok=True)
+        # Staged next to their destinations so that publishing is a rename.
+        image_dir = Path(tempfile.mkdtemp(prefix=".import-", dir=self.sandwich_dir))
+        derivative_root = Path(tempfile.mkdtemp(prefix=".import-", dir=self.derivative_root))
+        try:
+            converted = self._convert(valid, report, image_dir, derivative_root)
+
+            conflicts = self.catalog.add_sandwiches([(meal, ingredient) for _position, meal, ingredient in converted])
+            for (position, meal, _ingredient), conflict in zip(converted, conflicts):
+                if conflict is not None:
+                    # Added by someone else while the images were converted.
+                    report[position]["message"] = CONFLICT_MESSAGES[conflict]
+                    continue
+                self._publish(meal["image"], image_dir, derivative_root)
+                report[position]["status"] = "imported"
+                report[position]["item"] = meal
+        finally:
+            shutil.rmtree(image_dir, ignore_errors=True)
+            shutil.rmtree(derivative_root, ignore_errors=True)
+
+        imported = sum(1 for entry in report if entry["status"] == "imported")
+        return {"imported": imported, "failed": len(report) - imported, "items": report}
@@ -1,15 +1,50 @@
+import hashlib
 import json
 import os
+import threading
 import time
 from pathlib import Path
 from typing import Any, Dict
 
-from flask import Flask, jsonify, send_file, request, make_response
+from flask import Flask, Response, jsonify, send_file, request, make_response, stream_with_context
 from PIL import Image, UnidentifiedImageError
 
-from main import generate_img_from_args, CLIParser
-from paths import get_build_dir
-from style_config import load_style_config, save_style_config, validate_style_config
+from artifact_bundles import CLI_BUNDLE_ID, MAIL_FILENAME, bundle_dir, is_bundle_id, is_legacy_id, new_bundle_id
+from asset_cache import get_asset_cache
+from build_retention import ArtifactIndex, RetentionPolicy, RetentionSweeper
+from catalog_store import (
+    INGREDIENTS,
+    CatalogConflictError,
+    CatalogError,
+    get_catalog_store,
+    normalize_image_code,
+    sandwich_entries,
+)
+from file_utils import atomic_write_json
+from image_derivatives import (
+    derivative_widths,
+    generate_derivatives,
+    get_derivative_dir,
+    get_logo_derivative_dir,
+    logo_widths,
+)
+from main import RENDERER_BACKEND, CLIParser, MenuGenerator
+from menu_schema import validate_week_data
+from metrics import render_metrics
+from paths import env_int, get_build_dir
+from render_jobs import TERMINAL_STATUSES, JobQueueFullError, RenderJobQueue
+from renderer_pool import get_renderer_pool
+from renditions import FORMATS, MIMETYPES, select_rendition
+from sandwich_import import CONFLICT_MESSAGES, BatchImportError, SandwichImport, read_archive, read_uploads
+from style_config import (
+    StyleSnapshot,
+    get_style_snapshot,
+    load_style_config,
+    normalize_style_config,
+    save_style_config,
+    validate_style_config,
+)
+from style_preview import DEFAULT_QUALITY, PreviewGate, PreviewSupersededError, preview_scale
 
 app = Flask(__name__)
 
@@ -18,33 +53,56 @@ PROJECT_ROOT = Path(__file__).resolve().parent
 DEFAULT_IMAGE_DIR = PROJECT_ROOT / "default_img"
 LOGO_DIR = PROJECT_ROOT / "logos"
 SANDWICH_DIR = PROJECT_ROOT / "Sandwichlogo"
-INGREDIENTS_FILE = PROJECT_ROOT / "ingredients.json"
 BUILD_DIR = get_build_dir()
-MEAL_LIST_FILE = PROJECT_ROOT / "mealList.json"
 LAST_MENU_FILE = BUILD_DIR / "last_menu.txt"
+# Shared mailing text written before generations were bundled.
 MAIL_FILE = BUILD_DIR / "mail.txt"
 DEFAULT_MAIL_FILE = DEFAULT_IMAGE_DIR / "mail.txt"
 ALLOWED_ORIGIN = os.getenv("CORS_ALLOW_ORIGIN", "*")
 ALLOWED_HEADERS = os.getenv("CORS_ALLOW_HEADERS", "Authorization, Content-Type")
 ALLOWED_METHODS = os.getenv("CORS_ALLOW_METHODS", "GET, POST, PUT, OPTIONS")
+GENERATION_TIMEOUT = env_int("MENU_GENERATION_TIMEOUT", 50)
+RETENTION_SWEEP_INTERVAL = env_int("MENU_RETENTION_SWEEP_INTERVAL", 600)
+JOB_EVENTS_TIMEOUT = env_int("MENU_JOB_EVENTS_TIMEOUT", 120)
+PREWARM_RENDERER = os.getenv("MENU_RENDERER_PREWARM", "1").lower() in {"1", "true", "yes", "on"}
+# Generated images never change once published; the fallback is only shown until they are.
+IMAGE_MAX_AGE = env_int("MENU_IMAGE_MAX_AGE", 365 * 24 * 3600)
+FALLBACK_IMAGE_MAX_AGE = env_int("MENU_FALLBACK_IMAGE_MAX_AGE", 60)
 
-# Load meal list at application startup
-def load_meal_list():
+catalog = get_catalog_store()
+preview_gate = PreviewGate()
+
+
+def prewarm_renderer_pool():
+    """Launch the worker's browsers in the background so the first render is warm."""
     try:
-        with open(MEAL_LIST_FILE, "r", encoding="utf8") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return data
-            app.logger.warning(f"{MEAL_LIST_FILE} does not contain a list, using empty list")
-            return []
-    except FileNotFoundError:
-        app.logger.warning(f"{MEAL_LIST_FILE} not found, using empty list")
-        return []
-    except json.JSONDecodeError:
-        app.logger.warning(f"{MEAL_LIST_FILE} contains invalid JSON, using empty list")
-        return []
+        get_renderer_pool().warm()
+    except Exception as exc:
+        app.logger.warning(f"Unable to prewarm the renderer pool: {exc}")
+
+
+if PREWARM_RENDERER and RENDERER_BACKEND == "playwright":
+    threading.Thread(target=prewarm_renderer_pool, name="renderer-prewarm", daemon=True).start()
 
-mealList = load_meal_list()
+
+def run_generation(week_data):
+    """Render a parsed menu into a new bundle; runs on the render job workers."""
+    bundle_id = new_bundle_id()
+    atomic_write_json(LAST_MENU_FILE, week_data)
+    images, _email = MenuGenerator().generate_menu(week_data, bundle_id)
+    return {layout_name: bundle_id for layout_name in images}
+
+
+render_jobs = RenderJobQueue(run_generation)
+artifact_index = ArtifactIndex(BUILD_DIR)
+
+if RETENTION_SWEEP_INTERVAL > 0:
+    RetentionSweeper(
+        artifact_index,
+        RetentionPolicy.from_env(),
+        interval=RETENTION_SWEEP_INTERVAL,
+        on_error=lambda exc: app.logger.error(f"Build directory sweep failed: {exc}"),
+    ).start()
 
 # Helper functions
 def apply_cors_headers(response):
@@ -72,13 +130,6 @@ def attach_cors(response):
     """Ensure every response carries the CORS headers."""
     return apply_cors_headers(response)
 
-def save_json_to_file(data, filepath, *, indent=None):
-    """Save data as JSON to the specified file."""
-    path_obj = Path(filepath)
-    path_obj.parent.mkdir(parents=True, exist_ok=True)
-    with open(path_obj, "w", encoding="utf8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=indent)
-
 def load_json_from_file(filepath, default=None):
     """Load JSON data from file, return default if file doesn't exist"""
     path_obj = Path(filepath)
@@ -88,25 +139,54 @@ def load_json_from_file(filepath, default=None):
     return default
 
 
-def load_ingredients_data():
-    """Load the ingredients list from disk."""
-    try:
-        with open(INGREDIENTS_FILE, "r", encoding="utf8") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return data
-            app.logger.warning(f"{INGREDIENTS_FILE} does not contain a list, using empty list")
-            return []
-    except FileNotFoundError:
-        app.logger.warning(f"{INGREDIENTS_FILE} not found, creating new one on first write")
-        return []
-    except json.JSONDecodeError:
-        app.logger.error(f"{INGREDIENTS_FILE} contains invalid JSON")
-        raise
-
 def get_image_path(image_type, epoch):
-    """Get the image path based on type and epoch"""
-    return BUILD_DIR / f"{epoch}-{image_type}.png"
+    """Get the image path based on type and bundle id (or legacy epoch)."""
+    if is_bundle_id(epoch):
+        return bundle_dir(BUILD_DIR, epoch) / f"{image_type}.png"
+    if is_legacy_id(epoch):
+        # The CLI publishes a bundle under its legacy id; older runs left flat files.
+        published = bundle_dir(BUILD_DIR, epoch) / f"{image_type}.png"
+        if published.exists():
+            return published
+        return BUILD_DIR / f"{epoch}-{image_type}.png"
+    return None
+
+
+def get_mail_path(epoch):
+    """Mailing text of a bundle, or of the latest generation when no id is given."""
+    if is_bundle_id(epoch):
+        return bundle_dir(BUILD_DIR, epoch) / MAIL_FILENAME
+    if is_legacy_id(epoch) and bundle_dir(BUILD_DIR, epoch).is_dir():
+        return bundle_dir(BUILD_DIR, epoch) / MAIL_FILENAME
+
+    latest = artifact_index.latest()
+    if latest is not None and latest.get("dir"):
+        return BUILD_DIR / latest["dir"] / MAIL_FILENAME
+    return MAIL_FILE
+
+
+def file_etag(path):
+    """Content hash of a file, cached while its mtime and size are unchanged."""
+    return get_asset_cache().get("etag", path, lambda source: hashlib.sha256(source.read_bytes()).hexdigest())
+
+
+def image_response(path, max_age, immutable=False):
+    """Serve an image with its content hash as ETag, honouring conditional and Range requests."""
+    mimetype = MIMETYPES.get(Path(path).suffix.lstrip("."), 'image/png')
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=file_etag(path), max_age=max_age)
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+
+def accepted_image_types():
+    """Image types the client names explicitly; the ``format`` parameter overrides ``Accept``."""
+    requested = request.args.get("format", default="", type=str).lower()
+    if requested:
+        mimetype = FORMATS[requested][2] if requested in FORMATS else MIMETYPES.get(requested)
+        return [mimetype] if mimetype else []
+    return [value for value, quality in request.accept_mimetypes if quality > 0]
 
 
 def error_response(message, status=400):
@@ -114,20 +194,6 @@ def error_response(message, status=400):
     return cors_response(jsonify({"message": message})), status
 
 
-def normalize_image_code(raw_code):
-    """Normalize supplied image codes and block path traversal attempts."""
-    if not raw_code:
-        return ""
-
-    cleaned = Path(raw_code).stem.strip()
-    cleaned = cleaned.replace('/', '').replace('\\', '')
-
-    if cleaned in {"", ".", ".."}:
-        return ""
-
-    return cleaned
-
-
 def _logo_response_payload(relative_path: str, config: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "message": "Logo mis à jour",
@@ -140,31 +206,126 @@ def _logo_response_payload(relative_path: str, config: Dict[str, Any]) -> Dict[s
 # Routes
 @app.route('/getMealList', methods=['GET'])
 def get_meal_list():
-    response = jsonify(mealList)
+    response = jsonify(catalog.meals())
     return cors_response(response)
 
-@app.route('/generateImages', methods=['GET'])
+@app.route('/generateImages', methods=['GET', 'POST'])
 def generate_images():
-    args = request.args.get('menu', default="", type=str).split(" ")
-    
-    if args == [""]:
-        return cors_response(jsonify({"error": "No arguments provided"})), 400
-    
+    """Render a menu and wait for it.
+
+    POST takes the menu as JSON (the ``meal.json`` schema); GET keeps
+    accepting the CLI string of the ``menu`` query parameter.
+    """
+    if request.method == 'POST':
+        week_data, errors = validate_week_data(request.get_json(silent=True))
+        if errors:
+            return cors_response(jsonify({"error": "Invalid menu", "errors": errors})), 400
+    else:
+        menu = request.args.get('menu', default="", type=str)
+        if not menu.strip():
+            return cors_response(jsonify({"error": "No arguments provided"})), 400
+        week_data = CLIParser().parse_arguments(menu)
+
     try:
-        last_menu = CLIParser().parse_arguments(args)
-        filename = str(int(time.time()))
-        save_json_to_file(last_menu, LAST_MENU_FILE)
-        generate_img_from_args(args, filename)
-        
-        return cors_response(jsonify({
-            "message": "Images generated successfully", 
-            "vertical": filename, 
-            "horizontal": filename
-        }))
+        job = render_jobs.submit(week_data)
+    except JobQueueFullError as e:
+        return busy_response(jsonify({"error": str(e)}))
     except Exception as e:
         app.logger.error(f"Error generating images: {str(e)}")
         return cors_response(jsonify({"error": str(e)})), 500
 
+    job = render_jobs.wait(job["id"], timeout=GENERATION_TIMEOUT)
+    if job["status"] == "failed":
+        app.logger.error(f"Error generating images: {job['error']}")
+        return cors_response(jsonify({"error": job["error"]})), 500
+    if job["status"] != "done":
+        return cors_response(jsonify({
+            "message": "Generation still running",
+            "job": job["id"]
+        })), 202
+
+    return cors_response(jsonify({
+        "message": "Images generated successfully",
+        **job["result"]
+    }))
+
+
+def busy_response(response):
+    """Reject a submission because the render queue is full."""
+    response = cors_response(response)
+    response.status_code = 503
+    response.headers["Retry-After"] = "5"
+    return response
+
+
+@app.route('/renderJobs', methods=['POST'])
+def submit_render_job():
+    payload = request.get_json(silent=True)
+    menu = payload.get('menu') if isinstance(payload, dict) else None
+    if isinstance(menu, dict):
+        week_data, errors = validate_week_data(menu)
+        if errors:
+            return cors_response(jsonify({"message": "Menu invalide", "errors": errors})), 400
+    elif isinstance(menu, str) and menu.strip():
+        week_data = CLIParser().parse_arguments(menu)
+    else:
+        return error_response("Le champ 'menu' est requis", 400)
+
+    try:
+        job = render_jobs.submit(week_data)
+    except JobQueueFullError as exc:
+        return busy_response(jsonify({"message": str(exc)}))
+
+    response = cors_response(jsonify(job))
+    response.headers["Location"] = f"/renderJobs/{job['id']}"
+    return response, 202
+
+
+@app.route('/renderJobs/<job_id>', methods=['GET'])
+def get_render_job(job_id):
+    job = render_jobs.get(job_id)
+    if job is None:
+        return error_response("Tâche de génération introuvable", 404)
+    return cors_response(jsonify(job))
+
+
+@app.route('/renderJobs/<job_id>/events', methods=['GET'])
+def stream_render_job(job_id):
+    """Stream the job state as Server-Sent Events until it finishes."""
+    job = render_jobs.get(job_id)
+    if job is None:
+        return error_response("Tâche de génération introuvable", 404)
+
+    def events():
+        current = job
+        deadline = time.monotonic() + JOB_EVENTS_TIMEOUT
+        while True:
+            yield f"event: {current['status']}\ndata: {json.dumps(current, ensure_ascii=False)}\n\n"
+            remaining = deadline - time.monotonic()
+            if current["status"] in TERMINAL_STATUSES or remaining <= 0:
+                return
+            current = render_jobs.wait(job_id, timeout=remaining, changed_from=current["status"])
+            if current is None:
+                return
+
+    response = Response(stream_with_context(events()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return cors_response(response)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics of every worker."""
+    data, content_type = render_metrics()
+    return Response(data, content_type=content_type)
+
+@app.route('/generatedMenus', methods=['GET'])
+def list_generated_menus():
+    """List the artifacts kept in the build directory, newest first."""
+    artifacts = artifact_index.list()
+    artifacts.reverse()
+    return cors_response(jsonify(artifacts))
+
 @app.route('/getLastMenu', methods=['GET'])
 def get_last_menu():
     last_menu = load_json_from_file(LAST_MENU_FILE)
@@ -176,12 +337,15 @@ def get_last_menu():
 @app.route('/styleConfig', methods=['GET'])
 def get_style_config():
     try:
-        config = load_style_config()
+        snapshot = get_style_snapshot()
     except Exception as exc:
         app.logger.error(f"Failed to load style configuration: {exc}")
         return cors_response(jsonify({"message": "Impossible de charger la configuration du style"})), 500
 
-    return cors_response(jsonify(config))
+    response = Response(snapshot.json, mimetype="application/json")
+    response.set_etag(snapshot.version)
+    response.headers["Cache-Control"] = "no-cache"
+    return cors_response(response.make_conditional(request))
 
 
 @app.route('/styleConfig', methods=['PUT'])
@@ -210,6 +374,63 @@ def update_style_config():
     }))
 
 
+@app.route('/previewStyle', methods=['POST'])
+def preview_style():
+    """Render one layout of the last menu with an unsaved style, as a small JPEG.
+
+    Superseded requests of the same client (the ``client`` field, or its
+    address) are answered with 409 instead of being rendered.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return error_response("Un payload JSON valide est requis", 400)
+
+    style = payload.get("style")
+    errors = validate_style_config(style)
+    if errors:
+        return cors_response(jsonify({
+            "message": "Configuration de style invalide",
+            "errors": errors
+        })), 400
+
+    menu = payload.get("menu")
+    if menu is not None:
+        week_data, errors = validate_week_data(menu)
+        if errors:
+            return cors_response(jsonify({"message": "Menu invalide", "errors": errors})), 400
+    else:
+        week_data = load_json_from_file(LAST_MENU_FILE)
+        if week_data is None:
+            return error_response("Aucun menu généré pour l'aperçu", 400)
+
+    layout_name = str(payload.get("layout") or "vertical")
+    generator = MenuGenerator(style=StyleSnapshot.of(normalize_style_config(style)))
+    if layout_name not in generator.layouts:
+        return error_response(f"Mise en page '{layout_name}' inconnue", 400)
+
+    client = str(payload.get("client") or request.remote_addr or "")
+    try:
+        with preview_gate.enter(client) as ticket:
+            # Checked while waiting for a browser and between the render steps.
+            with generator.create_renderer(check=ticket.check) as renderer:
+                image, _warnings = generator.render_preview(
+                    week_data,
+                    layout_name,
+                    scale=preview_scale(payload.get("scale")),
+                    quality=DEFAULT_QUALITY,
+                    renderer=renderer,
+                )
+    except PreviewSupersededError as exc:
+        return error_response(str(exc), 409)
+    except Exception as exc:
+        app.logger.error(f"Failed to render style preview: {exc}")
+        return error_response("Impossible de générer l'aperçu", 500)
+
+    response = Response(image, mimetype="image/jpeg")
+    response.headers["Cache-Control"] = "no-store"
+    return cors_response(response)
+
+
 @app.route('/logo', methods=['POST'])
 def upload_logo():
     image_file = request.files.get('imageFile') if request.files else None
@@ -229,12 +450,19 @@ def upload_logo():
         image = Image.open(image_file.stream)
         image = image.convert("RGBA")
         image.save(target_path, format="PNG")
+        get_asset_cache().invalidate(target_path)
     except UnidentifiedImageError:
         return error_response("Le fichier envoyé n'est pas une image valide", 400)
     except Exception as exc:
         app.logger.error(f"Failed to save uploaded logo: {exc}")
         return error_response("Impossible d'enregistrer le logo", 500)
 
+    try:
+        generate_derivatives(target_path, logo_widths(), get_logo_derivative_dir())
+    except Exception as exc:
+        # The renderer falls back on the full-size logo.
+        app.logger.warning(f"Failed to generate logo derivatives: {exc}")
+
     try:
         config = load_style_config()
         assets = dict(config.get('assets', {}))
@@ -251,8 +479,9 @@ def upload_logo():
 
 @app.route('/getMailingText', methods=['GET'])
 def get_mailing_text():
+    epoch = request.args.get("epoch", default="", type=str)
     try:
-        with open(MAIL_FILE, "r", encoding="utf8") as f:
+        with open(get_mail_path(epoch), "r", encoding="utf8") as f:
             mailing_text = f.read()
     except FileNotFoundError:
         with open(DEFAULT_MAIL_FILE, "r", encoding="utf8") as f:
@@ -274,16 +503,28 @@ def get_menu_image(image_type):
     file_name = get_image_path(image_type, epoch)
     
     try:
-        return send_file(file_name, mimetype='image/png')
+        if file_name is None:
+            raise FileNotFoundError(epoch)
+        # The CLI bundle is replaced by every CLI run, so it is only cached briefly.
+        immutable = epoch != CLI_BUNDLE_ID
+        max_age = IMAGE_MAX_AGE if immutable else FALLBACK_IMAGE_MAX_AGE
+        if file_name.parent == BUILD_DIR:
+            # Flat files of older generations have no renditions.
+            return image_response(file_name, max_age, immutable=immutable)
+        rendition = select_rendition(file_name, accepted_image_types(), request.args.get("width", type=int))
+        response = image_response(rendition, max_age, immutable=immutable)
+        response.vary.add("Accept")
+        return response
     except FileNotFoundError:
-        return send_file(DEFAULT_IMAGE_DIR / f"{image_type}.png", mimetype='image/png')
+        response = image_response(DEFAULT_IMAGE_DIR / f"{image_type}.png", FALLBACK_IMAGE_MAX_AGE)
+        response.headers["X-Menu-Image"] = "default"
+        response.headers["Access-Control-Expose-Headers"] = "X-Menu-Image"
+        return response
 
 
 @app.route('/addSandwich', methods=['POST'])
 def add_sandwich():
     """Persist a new sandwich definition and optional image asset."""
-    global mealList
-
     payload = {}
     if request.is_json:
         payload = request.get_json(silent=True) or {}
@@ -310,18 +551,14 @@ def add_sandwich():
     if not image_code:
         return error_response("Un code image ou un fichier valide est requis", 400)
 
-    english_description = english_description or french_description
-
-    if not isinstance(mealList, list):
-        mealList = []
+    new_entry, ingredient_entry = sandwich_entries(
+        name, image_code, french_description, english_description, is_vegetarian
+    )
+    english_description = ingredient_entry[2]
 
-    if any((entry.get('name') or '').strip().lower() == name.lower() for entry in mealList if isinstance(entry, dict)):
-        return error_response("Ce nom de sandwich existe déjà", 409)
-
-    if any((entry.get('image') or '').strip().lower() == image_code.lower() for entry in mealList if isinstance(entry, dict)):
-        return error_response("Ce code image est déjà utilisé", 409)
-
-    saved_image_code = image_code
+    conflict = catalog.find_conflict(new_entry)
+    if conflict is not None:
+        return error_response(CONFLICT_MESSAGES[conflict], 409)
 
     if image_file and image_file.filename:
         target_path = SANDWICH_DIR / f"{image_code}.png"
@@ -332,54 +569,35 @@ def add_sandwich():
             image = Image.open(image_file.stream)
             image = image.convert("RGBA")
             image.save(target_path, format="PNG")
+            get_asset_cache().invalidate(target_path)
         except UnidentifiedImageError:
             return error_response("Le fichier envoyé n'est pas une image valide", 400)
         except Exception as exc:  # Catch unexpected IO issues
             app.logger.error(f"Failed to save sandwich image: {exc}")
             return error_response("Impossible d'enregistrer l'image du sandwich", 500)
 
-    new_entry = {
-        "name": name,
-        "image": saved_image_code
-    }
-
-    ingredient_entry_name = name
-    if is_vegetarian and "(végé/veggie)" not in ingredient_entry_name.lower():
-        ingredient_entry_name = f"{ingredient_entry_name} (végé/veggie)"
-
-    ingredient_entry = [
-        ingredient_entry_name,
-        french_description,
-        english_description
-    ]
-
-    mealList.append(new_entry)
+        try:
+            generate_derivatives(target_path, derivative_widths(get_style_snapshot().config["layouts"]))
+        except Exception as exc:
+            # The renderer falls back on the full-size image.
+            app.logger.warning(f"Failed to generate sandwich image derivatives: {exc}")
 
     try:
-        save_json_to_file(mealList, MEAL_LIST_FILE, indent=4)
-    except Exception as exc:
-        mealList.pop()
-        app.logger.error(f"Failed to write meal list: {exc}")
+        # Checks the duplicates again under the catalog lock.
+        catalog.add_sandwich(new_entry, ingredient_entry)
+    except CatalogConflictError as exc:
+        return error_response(CONFLICT_MESSAGES[exc.field], 409)
+    except CatalogError as exc:
+        app.logger.error(f"Failed to save sandwich: {exc}")
+        if exc.kind == INGREDIENTS:
+            return error_response("Impossible d'enregistrer les descriptions du sandwich sur le serveur", 500)
         return error_response("Impossible d'enregistrer le sandwich sur le serveur", 500)
 
-    try:
-        ingredients_data = load_ingredients_data()
-        ingredients_data.append(ingredient_entry)
-        save_json_to_file(ingredients_data, INGREDIENTS_FILE, indent=4)
-    except Exception as exc:
-        app.logger.error(f"Failed to append ingredient entry: {exc}")
-        mealList.pop()
-        try:
-            save_json_to_file(mealList, MEAL_LIST_FILE, indent=4)
-        except Exception as rollback_error:
-            app.logger.error(f"Failed to rollback meal list after ingredient error: {rollback_error}")
-        return error_response("Impossible d'enregistrer les descriptions du sandwich sur le serveur", 500)
-
     response_payload = {
         "message": "Sandwich ajouté avec succès",
         "item": new_entry,
         "ingredient": {
-            "name": ingredient_entry_name,
+            "name": ingredient_entry[0],
             "frenchDescription": french_description,
             "englishDescription": english_description,
             "isVegetarian": is_vegetarian
@@ -388,6 +606,41 @@ def add_sandwich():
 
     return cors_response(jsonify(response_payload)), 201
 
+@app.route('/importSandwiches', methods=['POST'])
+def import_sandwiches():
+    """Add a batch of sandwiches from a zip archive or a manifest plus image files."""
+    try:
+        archive = request.files.get('archive')
+        if archive and archive.filename:
+            items, files = read_archive(archive.stream)
+        else:
+            manifest = request.files.get('manifest')
+            if not manifest or not manifest.filename:
+                return error_response("Une archive ou un manifeste est requis", 400)
+            items, files = read_uploads(manifest, request.files.getlist('images'))
+    except BatchImportError as exc:
+        return error_response(str(exc), 400)
+
+    importer = SandwichImport(
+        catalog,
+        widths=derivative_widths(get_style_snapshot().config["layouts"]),
+        derivative_root=get_derivative_dir(),
+        sandwich_dir=SANDWICH_DIR,
+    )
+    try:
+        report = importer.run(items, files)
+    except CatalogError as exc:
+        app.logger.error(f"Failed to import sandwiches: {exc}")
+        return error_response("Impossible d'enregistrer les sandwichs sur le serveur", 500)
+
+    for entry in report["items"]:
+        if entry["status"] == "imported":
+            get_asset_cache().invalidate(SANDWICH_DIR / f"{entry['image']}.png")
+
+    report["message"] = f"{report['imported']} sandwich(s) importé(s), {report['failed']} en erreur"
+    return cors_response(jsonify(report)), 201 if report["imported"] else 400
+
+
 if __name__ == '__main__':
     # This block only runs when executing the script directly (development mode)
     # It won't run when the application is served by Gunicorn
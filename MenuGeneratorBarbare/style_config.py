@@ -1,7 +1,14 @@
+import hashlib
 import json
+import threading
+import time
 from copy import deepcopy
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
+
+from file_utils import atomic_write_json
+from paths import env_float
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 STYLE_CONFIG_FILE = PROJECT_ROOT / "style.json"
@@ -96,7 +103,8 @@ def _ensure_string(value: Any, fallback: str) -> str:
 
 
 def _normalize_layout(name: str, layout: Dict[str, Any]) -> Dict[str, Any]:
-    default_layout = DEFAULT_STYLE_CONFIG["layouts"][name]
+    # Extra layouts declared in style.json fall back on the vertical defaults.
+    default_layout = DEFAULT_STYLE_CONFIG["layouts"].get(name, DEFAULT_STYLE_CONFIG["layouts"]["vertical"])
     normalized = {
         "image_size": _ensure_numeric_pair(layout.get("image_size"), default_layout["image_size"]),
         "title_position": _ensure_numeric_pair(layout.get("title_position"), default_layout["title_position"]),
@@ -128,8 +136,9 @@ def normalize_style_config(config: Dict[str, Any]) -> Dict[str, Any]:
         normalized_colors[key] = _ensure_string(merged.get("colors", {}).get(key), default_value)
 
     normalized_layouts: Dict[str, Dict[str, Any]] = {}
-    for layout_name in DEFAULT_STYLE_CONFIG["layouts"].keys():
-        layout_data = merged.get("layouts", {}).get(layout_name, {})
+    for layout_name, layout_data in merged.get("layouts", {}).items():
+        if not isinstance(layout_data, dict):
+            layout_data = {}
         normalized_layouts[layout_name] = _normalize_layout(layout_name, layout_data)
 
     normalized_assets: Dict[str, str] = {}
@@ -144,26 +153,145 @@ def normalize_style_config(config: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def load_style_config() -> Dict[str, Any]:
-    if not STYLE_CONFIG_FILE.exists():
-        return deepcopy(DEFAULT_STYLE_CONFIG)
+class FrozenDict(dict):
+    """A read-only dict; still a ``dict`` for ``json`` and ``**`` unpacking."""
+
+    def _read_only(self, *_args: Any, **_kwargs: Any) -> Any:
+        raise TypeError("Style configuration snapshots are read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def __deepcopy__(self, _memo: Dict[int, Any]) -> Dict[str, Any]:
+        return thaw(self)
+
+
+def freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """A mutable deep copy of a frozen value."""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+@dataclass(frozen=True)
+class StyleSnapshot:
+    """A normalized style configuration that nobody can modify.
+
+    ``version`` changes whenever the configuration does (it is derived from
+    the content, so every worker agrees on it) and ``json`` is the
+    serialized configuration.
+    """
+
+    config: FrozenDict
+    version: str
+    json: str
+
+    @classmethod
+    def of(cls, normalized: Dict[str, Any]) -> "StyleSnapshot":
+        serialized = json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+        version = hashlib.sha256(serialized.encode("utf8")).hexdigest()[:16]
+        return cls(config=freeze(normalized), version=version, json=serialized)
+
+
+class StyleConfigService:
+    """Keeps the normalized ``style.json`` in memory.
+
+    The file is checked with a ``stat`` at most once per
+    ``revalidate_interval`` seconds, so changes saved by another worker are
+    picked up shortly after, and saves from this process apply at once.
+    """
+
+    def __init__(self, path: Optional[Path] = None, revalidate_interval: Optional[float] = None) -> None:
+        self.path = Path(path) if path is not None else get_style_config_path()
+        if revalidate_interval is None:
+            revalidate_interval = env_float("MENU_STYLE_REVALIDATE_INTERVAL", 1.0)
+        self.revalidate_interval = max(0.0, revalidate_interval)
+        self._lock = threading.Lock()
+        self._snapshot: Optional[StyleSnapshot] = None
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._checked_at = 0.0
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf8") as file:
+                raw_config = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return deepcopy(DEFAULT_STYLE_CONFIG)
+        if not isinstance(raw_config, dict):
+            return deepcopy(DEFAULT_STYLE_CONFIG)
+        return normalize_style_config(raw_config)
+
+    def snapshot(self) -> StyleSnapshot:
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is not None and now - self._checked_at < self.revalidate_interval:
+                return self._snapshot
+            self._checked_at = now
+            signature = self._stat()
+            if self._snapshot is None or signature != self._signature:
+                # Stat before reading: a write racing with the read is seen next time.
+                self._snapshot = StyleSnapshot.of(self._read())
+                self._signature = signature
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+    def save(self, config: Dict[str, Any]) -> StyleSnapshot:
+        normalized = normalize_style_config(config)
+        with self._lock:
+            atomic_write_json(self.path, normalized, indent=4)
+            self._snapshot = StyleSnapshot.of(normalized)
+            self._signature = self._stat()
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+
+_service: Optional[StyleConfigService] = None
+_service_lock = threading.Lock()
+
+
+def get_style_service() -> StyleConfigService:
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = StyleConfigService()
+        return _service
+
+
+def get_style_snapshot() -> StyleSnapshot:
+    """The current style configuration, read-only and cheap to call."""
+    return get_style_service().snapshot()
 
-    try:
-        with open(STYLE_CONFIG_FILE, "r", encoding="utf8") as file:
-            raw_config = json.load(file)
-            if not isinstance(raw_config, dict):
-                return deepcopy(DEFAULT_STYLE_CONFIG)
-            return normalize_style_config(raw_config)
-    except json.JSONDecodeError:
-        return deepcopy(DEFAULT_STYLE_CONFIG)
+
+def load_style_config() -> Dict[str, Any]:
+    """A mutable copy of the current style configuration."""
+    return thaw(get_style_snapshot().config)
 
 
 def save_style_config(config: Dict[str, Any]) -> Dict[str, Any]:
-    normalized = normalize_style_config(config)
-    STYLE_CONFIG_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(STYLE_CONFIG_FILE, "w", encoding="utf8") as file:
-        json.dump(normalized, file, ensure_ascii=False, indent=4)
-    return normalized
+    return thaw(get_style_service().save(config).config)
 
 
 def validate_style_config(config: Any) -> List[str]:
@@ -0,0 +1,87 @@
+"""Superseding of the live previews requested by the style editor.
+
+The editor asks for a preview on every change, but only the last one
+matters. Each client has a token file under ``<build dir>/previews``: a
+request writes its own token there and gives up as soon as a later request
+of the same client has replaced it, whether it is still waiting for a
+browser or already rendering. The file is shared, so this holds across
+Gunicorn workers. Nothing sleeps on the request thread: the editor
+debounces its own requests.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import uuid
+from pathlib import Path
+from typing import Any, Optional
+
+from file_utils import atomic_write_text
+from paths import env_float, env_int, get_build_dir
+
+PREVIEW_DIR_NAME = "previews"
+# Every scale is a browser context kept by each browser, so only these are rendered.
+PREVIEW_SCALES = (0.25, 0.5, 0.75, 1.0)
+DEFAULT_SCALE = env_float("MENU_PREVIEW_SCALE", 0.5)
+DEFAULT_QUALITY = env_int("MENU_PREVIEW_QUALITY", 70)
+
+
+class PreviewSupersededError(Exception):
+    """A more recent preview was requested by the same client."""
+
+
+def preview_scale(value: Any, default: float = DEFAULT_SCALE) -> float:
+    """The smallest of ``PREVIEW_SCALES`` at least as large as the requested scale."""
+    try:
+        scale = float(value) if value is not None else default
+    except (TypeError, ValueError):
+        scale = default
+    if scale != scale:  # NaN
+        scale = default
+    return next((candidate for candidate in PREVIEW_SCALES if candidate >= scale), PREVIEW_SCALES[-1])
+
+
+class PreviewTicket:
+    """The turn of one preview request; ``check`` it before each costly step."""
+
+    def __init__(self, path: Path, token: str) -> None:
+        self.path = path
+        self.token = token
+
+    def is_current(self) -> bool:
+        try:
+            return self.path.read_text(encoding="utf8") == self.token
+        except FileNotFoundError:
+            return True
+
+    def check(self) -> None:
+        if not self.is_current():
+            raise PreviewSupersededError("Aperçu remplacé par une demande plus récente")
+
+    def close(self) -> None:
+        """Drop the token file unless a later request owns it."""
+        if self.is_current():
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self) -> "PreviewTicket":
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.close()
+
+
+class PreviewGate:
+    """Hands out the turns of preview requests, the last one of a client winning."""
+
+    def __init__(self, directory: Optional[Path] = None) -> None:
+        self.directory = Path(directory) if directory is not None else get_build_dir() / PREVIEW_DIR_NAME
+
+    def enter(self, client: str) -> PreviewTicket:
+        """Take the turn of ``client`` from any earlier request of it."""
+        name = hashlib.sha256(client.encode("utf8")).hexdigest()[:16]
+        ticket = PreviewTicket(self.directory / name, uuid.uuid4().hex)
+        atomic_write_text(ticket.path, ticket.token)
+        return ticket